@@ -1,3 +1,5 @@
+import os
+
 from mininet.net import Mininet
 from mininet.topo import Topo, SingleSwitchTopo
 
@@ -44,6 +46,7 @@ def configureP4RuntimeSimpleSwitch(prog_or_filename, **switch_args):
                 log_console=config.bmv2_log,
                 program=prog,
                 pcap_dump=config.pcap_dump,
+                batch=True,
                 )
             kwargs2.update(switch_args)
             kwargs2.update(kwargs)
@@ -98,11 +101,19 @@ class P4Mininet(Mininet):
             self.setupARP()
 
     def setupARP(self):
-        tbl = [(intf.ip, intf.mac) for h in self.hosts for intf in h.intfs.values()]
+        """
+        Static ARP entries for all hosts on every host interface. Each host
+        gets a batch file for `ip -batch`, so this takes one shell command
+        per host instead of one per host, interface and entry
+        """
+        tbl = [(intf.ip, intf.mac) for h in self.hosts for intf in h.intfs.values() if intf.ip]
         for h in self.hosts:
-            for intf in h.intfs.values():
-                for ip, mac in tbl:
-                    h.cmd('arp -i %s -s %s %s' % (intf.name, ip, mac))
+            path = os.path.join(get_logs_directory(), 'arp-%s.batch' % h.name)
+            with open(path, 'w') as f:
+                for intf in h.intfs.values():
+                    for ip, mac in tbl:
+                        f.write('neigh replace %s lladdr %s dev %s nud permanent\n' % (ip, mac, intf.name))
+            h.cmd('ip -force -batch %s' % path)
 
 
 
@@ -15,8 +15,6 @@
 import re
 import socket
 
-import math
-
 '''
 This package contains several helper functions for encoding to and decoding from byte strings:
 - integers
@@ -24,6 +22,12 @@ This package contains several helper functions for encoding to and decoding from
 - Ethernet address strings
 '''
 
+# How `encode` reads strings. P4 programs carry MAC and IPv4 addresses in
+# fields of these widths, so the width of the P4Info field is the type hint
+MAC  = 'mac'
+IPV4 = 'ipv4'
+STRING_KINDS = {48: MAC, 32: IPV4}
+
 mac_pattern = re.compile('^([\da-fA-F]{2}:){5}([\da-fA-F]{2})$')
 def matchesMac(mac_addr_string):
     return mac_pattern.match(mac_addr_string) is not None
@@ -32,7 +36,7 @@ def encodeMac(mac_addr_string):
     return bytes.fromhex(mac_addr_string.replace(':', ''))
 
 def decodeMac(encoded_mac_addr):
-    return ':'.join(s.encode('hex') for s in encoded_mac_addr)
+    return encoded_mac_addr.hex(':')
 
 ip_pattern = re.compile('^(\d{1,3}\.){3}(\d{1,3})$')
 def matchesIPv4(ip_addr_string):
@@ -45,57 +49,66 @@ def decodeIPv4(encoded_ip_addr):
     return socket.inet_ntoa(encoded_ip_addr)
 
 def bitwidthToBytes(bitwidth):
-    return int(math.ceil(bitwidth / 8.0))
+    return (bitwidth + 7) // 8
 
-def encodeNum(number, bitwidth):
-    byte_len = bitwidthToBytes(bitwidth)
-    num_str = '%x' % number
-    if number >= 2 ** bitwidth:
+def encodeNum(number, bitwidth, byte_len=None):
+    if number < 0 or number >> bitwidth:
         raise Exception("Number, %d, does not fit in %d bits" % (number, bitwidth))
-    return bytes.fromhex('0' * (byte_len * 2 - len(num_str)) + num_str)
+    return number.to_bytes(byte_len if byte_len is not None else bitwidthToBytes(bitwidth), 'big')
 
 def decodeNum(encoded_number):
-    return int(encoded_number.encode('hex'), 16)
-
-def encode(x, bitwidth):
-    'Tries to infer the type of `x` and encode it'
-    byte_len = bitwidthToBytes(bitwidth)
+    return int.from_bytes(encoded_number, 'big')
+
+def fieldFormat(bitwidth):
+    'The arguments of `encode` after `x` for a field of `bitwidth` bits, to compute them only once per field'
+    return (bitwidth, bitwidthToBytes(bitwidth), STRING_KINDS.get(bitwidth))
+
+def encode(x, bitwidth, byte_len=None, kind=None):
+    '''
+    Encodes `x` by its type: ints by value, bytes as they are and strings as
+    `kind` (MAC or IPV4). Pass `byte_len` and `kind` as returned by
+    fieldFormat, or neither to derive them from `bitwidth`
+    '''
+    if byte_len is None:
+        byte_len, kind = bitwidthToBytes(bitwidth), STRING_KINDS.get(bitwidth)
     if (type(x) == list or type(x) == tuple) and len(x) == 1:
         x = x[0]
-    encoded_bytes = None
-    if type(x) == str:
-        if matchesMac(x):
+    if type(x) == int:
+        return encodeNum(x, bitwidth, byte_len)
+    if type(x) == bytes:
+        encoded_bytes = x
+    elif type(x) == str:
+        # The kind only narrows the formats, the string must still match one
+        if kind in (MAC, None) and matchesMac(x):
             encoded_bytes = encodeMac(x)
-        elif matchesIPv4(x):
+        elif kind in (IPV4, None) and matchesIPv4(x):
             encoded_bytes = encodeIPv4(x)
         else:
-            # Assume that the string is already encoded
-            encoded_bytes = x
-    elif type(x) == int:
-        encoded_bytes = encodeNum(x, bitwidth)
+            raise Exception("Cannot encode %r in %d bits" % (x, bitwidth))
     else:
         raise Exception("Encoding objects of %r is not supported" % type(x))
-    assert(len(encoded_bytes) == byte_len)
+    if len(encoded_bytes) != byte_len:
+        raise Exception("%r is not %d bytes wide" % (x, byte_len))
     return encoded_bytes
 
 if __name__ == '__main__':
     # TODO These tests should be moved out of main eventually
     mac = "aa:bb:cc:dd:ee:ff"
     enc_mac = encodeMac(mac)
-    assert(enc_mac == '\xaa\xbb\xcc\xdd\xee\xff')
+    assert(enc_mac == b'\xaa\xbb\xcc\xdd\xee\xff')
     dec_mac = decodeMac(enc_mac)
     assert(mac == dec_mac)
 
     ip = "10.0.0.1"
     enc_ip = encodeIPv4(ip)
-    assert(enc_ip == '\x0a\x00\x00\x01')
+    assert(enc_ip == b'\x0a\x00\x00\x01')
     dec_ip = decodeIPv4(enc_ip)
     assert(ip == dec_ip)
 
     num = 1337
     byte_len = 5
     enc_num = encodeNum(num, byte_len * 8)
-    assert(enc_num == '\x00\x00\x00\x05\x39')
+    assert(enc_num == b'\x00\x00\x00\x05\x39')
     dec_num = decodeNum(enc_num)
     assert(num == dec_num)
 
@@ -110,6 +123,16 @@ if __name__ == '__main__':
     assert(encode((num,), 5 * 8) == enc_num)
     assert(encode([num], 5 * 8) == enc_num)
 
+    for bad, bitwidth in (("1234", 32), ("10.1", 32), (mac, 32), ("aa:bb:cc", 48), (ip, 48)):
+        try:
+            encode(bad, bitwidth)
+        except Exception:
+            continue
+        raise AssertionError("%r was encoded in %d bits" % (bad, bitwidth))
+    assert(encode(enc_num, 5 * 8) == enc_num)
+    assert(encode(mac, *fieldFormat(48)) == enc_mac)
+    assert(encode(1, 9) == b'\x00\x01')
+
     num = 256
     byte_len = 2
     try:
@@ -12,13 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import re
+import sys
+import time
 
 import google.protobuf.text_format
 from p4.v1 import p4runtime_pb2
 from p4.config.v1 import p4info_pb2
 
-from .convert import encode
+from .convert import encode, fieldFormat
 
 class ReplicaMgr(object):
     def __init__(self, group):
@@ -36,6 +37,66 @@ class ReplicaMgr(object):
         for r in self.group.replicas:
             yield (r.egress_port, r.instance)
 
+class TableEntryTemplate(object):
+    """
+    A table entry with the ids and bit widths of its table, action, match
+    fields and action params resolved once, see P4InfoHelper.prepareTableEntry.
+    build() only takes the values, in the order the names were given
+    """
+    def __init__(self, helper, table_name, match_fields=(), action_name=None,
+                 action_params=(), default_action=False, priority=None):
+        self.table_name = table_name
+        self.table_id = helper.get_tables_id(table_name)
+        self.default_action = default_action
+        self.priority = priority
+        self.match_fields = []
+        for name in match_fields:
+            mf = helper.get_match_field(table_name, name)
+            self.match_fields.append((mf.id, mf.match_type, fieldFormat(mf.bitwidth)))
+        self.action_id = helper.get_actions_id(action_name) if action_name else None
+        self.action_params = []
+        for name in action_params:
+            p = helper.get_action_param(action_name, name)
+            self.action_params.append((p.id, fieldFormat(p.bitwidth)))
+
+    def build(self, match_values=(), param_values=()):
+        if len(match_values) != len(self.match_fields) or len(param_values) != len(self.action_params):
+            raise Exception("%s expects %d match values and %d params, got %d and %d" %
+                            (self.table_name, len(self.match_fields), len(self.action_params),
+                             len(match_values), len(param_values)))
+        table_entry = p4runtime_pb2.TableEntry()
+        table_entry.table_id = self.table_id
+        if self.priority is not None:
+            table_entry.priority = self.priority
+        if self.default_action:
+            table_entry.is_default_action = True
+
+        for (field_id, match_type, fmt), value in zip(self.match_fields, match_values):
+            m = table_entry.match.add()
+            m.field_id = field_id
+            if match_type == p4info_pb2.MatchField.EXACT:
+                m.exact.value = encode(value, *fmt)
+            elif match_type == p4info_pb2.MatchField.LPM:
+                m.lpm.value = encode(value[0], *fmt)
+                m.lpm.prefix_len = value[1]
+            elif match_type == p4info_pb2.MatchField.TERNARY:
+                m.ternary.value = encode(value[0], *fmt)
+                m.ternary.mask = encode(value[1], *fmt)
+            elif match_type == p4info_pb2.MatchField.RANGE:
+                m.range.low = encode(value[0], *fmt)
+                m.range.high = encode(value[1], *fmt)
+            else:
+                raise Exception("Unsupported match type with type %r" % match_type)
+
+        if self.action_id is not None:
+            action = table_entry.action.action
+            action.action_id = self.action_id
+            for (param_id, fmt), value in zip(self.action_params, param_values):
+                p = action.params.add()
+                p.param_id = param_id
+                p.value = encode(value, *fmt)
+        return table_entry
+
 class P4InfoHelper(object):
     def __init__(self, p4_info_filepath):
         p4info = p4info_pb2.P4Info()
@@ -43,19 +104,43 @@ class P4InfoHelper(object):
         with open(p4_info_filepath) as p4info_f:
             google.protobuf.text_format.Merge(p4info_f.read(), p4info)
         self.p4info = p4info
+        self._buildIndex()
+
+    def _buildIndex(self):
+        # Name/alias and id lookups for every top-level entity type with a
+        # preamble (tables, actions, counters, registers, ...), and for the
+        # match fields of each table and the params of each action, so that
+        # building an entry does not scan the P4Info
+        self.entities = {}
+        for field in self.p4info.DESCRIPTOR.fields:
+            if field.message_type is None or 'preamble' not in field.message_type.fields_by_name:
+                continue
+            by_name, by_id = {}, {}
+            for o in getattr(self.p4info, field.name):
+                by_name.setdefault(o.preamble.name, o)
+                by_id.setdefault(o.preamble.id, o)
+            # A name wins over an alias that happens to be equal
+            for o in getattr(self.p4info, field.name):
+                by_name.setdefault(o.preamble.alias, o)
+            self.entities[field.name] = (by_name, by_id)
+
+        self.match_fields = {}
+        for t in self.p4info.tables:
+            self.match_fields.setdefault(t.preamble.name,
+                ({mf.name: mf for mf in t.match_fields}, {mf.id: mf for mf in t.match_fields}))
+        self.action_params = {}
+        for a in self.p4info.actions:
+            self.action_params.setdefault(a.preamble.name,
+                ({p.name: p for p in a.params}, {p.id: p for p in a.params}))
 
     def get(self, entity_type, name=None, id=None):
         if name is not None and id is not None:
             raise AssertionError("name or id must be None")
 
-        for o in getattr(self.p4info, entity_type):
-            pre = o.preamble
-            if name:
-                if (pre.name == name or pre.alias == name):
-                    return o
-            else:
-                if pre.id == id:
-                    return o
+        by_name, by_id = self.entities.get(entity_type, ({}, {}))
+        o = by_name.get(name) if name else by_id.get(id)
+        if o is not None:
+            return o
 
         if name:
             raise AttributeError("Could not find %r of type %s" % (name, entity_type))
@@ -74,31 +159,28 @@ class P4InfoHelper(object):
     def __getattr__(self, attr):
         # Synthesize convenience functions for name to id lookups for top-level entities
         # e.g. get_tables_id(name_string) or get_actions_id(name_string)
-        m = re.search("^get_(\w+)_id$", attr)
-        if m:
-            primitive = m.group(1)
-            return lambda name: self.get_id(primitive, name)
+        if attr.startswith("get_") and attr.endswith("_id") and len(attr) > 7:
+            primitive = attr[4:-3]
+            fn = lambda name: self.get_id(primitive, name)
 
         # Synthesize convenience functions for id to name lookups
         # e.g. get_tables_name(id) or get_actions_name(id)
-        m = re.search("^get_(\w+)_name$", attr)
-        if m:
-            primitive = m.group(1)
-            return lambda id: self.get_name(primitive, id)
+        elif attr.startswith("get_") and attr.endswith("_name") and len(attr) > 9:
+            primitive = attr[4:-5]
+            fn = lambda id: self.get_name(primitive, id)
+
+        else:
+            raise AttributeError("%r object has no attribute %r" % (self.__class__, attr))
 
-        raise AttributeError("%r object has no attribute %r" % (self.__class__, attr))
+        # __getattr__ only runs for missing attributes, so later calls skip it
+        setattr(self, attr, fn)
+        return fn
 
     def get_match_field(self, table_name, name=None, id=None):
-        for t in self.p4info.tables:
-            pre = t.preamble
-            if pre.name == table_name:
-                for mf in t.match_fields:
-                    if name is not None:
-                        if mf.name == name:
-                            return mf
-                    elif id is not None:
-                        if mf.id == id:
-                            return mf
+        by_name, by_id = self.match_fields.get(table_name, ({}, {}))
+        mf = by_name.get(name) if name is not None else by_id.get(id)
+        if mf is not None:
+            return mf
         raise AttributeError("%r has no attribute %r" % (table_name, name if name is not None else id))
 
     def get_match_field_id(self, table_name, match_field_name):
@@ -153,17 +235,11 @@ class P4InfoHelper(object):
             raise Exception("Unsupported match type with type %r" % match_type)
 
     def get_action_param(self, action_name, name=None, id=None):
-        for a in self.p4info.actions:
-            pre = a.preamble
-            if pre.name == action_name:
-                for p in a.params:
-                    if name is not None:
-                        if p.name == name:
-                            return p
-                    elif id is not None:
-                        if p.id == id:
-                            return p
-        raise AttributeError("action %r has no param %r, (has: %r)" % (action_name, name if name is not None else id, a.params))
+        by_name, by_id = self.action_params.get(action_name, ({}, {}))
+        p = by_name.get(name) if name is not None else by_id.get(id)
+        if p is not None:
+            return p
+        raise AttributeError("action %r has no param %r, (has: %r)" % (action_name, name if name is not None else id, list(by_name)))
 
     def get_action_param_id(self, action_name, param_name):
         return self.get_action_param(action_name, name=param_name).id
@@ -210,6 +286,21 @@ class P4InfoHelper(object):
                 ])
         return table_entry
 
+    def prepareTableEntry(self,
+                          table_name,
+                          match_fields=(),
+                          action_name=None,
+                          action_params=(),
+                          default_action=False,
+                          priority=None):
+        """
+        Returns a TableEntryTemplate for entries of table_name with the given
+        match field and action param names, for inserting many entries that
+        only differ in their values
+        """
+        return TableEntryTemplate(self, table_name, match_fields, action_name,
+                                  action_params, default_action, priority)
+
     def buildMulticastGroup(self,
                         mgid=None,
                         ports=None):
@@ -220,3 +311,32 @@ class P4InfoHelper(object):
             replicas.append(port, i)
         return group
 
+if __name__ == '__main__':
+    # Microbenchmark of entry construction, run from lib/p4app/src:
+    #   python -m p4runtime_lib.helper <p4info.txt> [table] [entries]
+    helper = P4InfoHelper(sys.argv[1])
+    table = helper.get('tables', name=sys.argv[2]) if len(sys.argv) > 2 else helper.p4info.tables[0]
+    num_entries = int(sys.argv[3]) if len(sys.argv) > 3 else 100000
+    action = helper.get('actions', id=table.action_refs[0].id)
+    table_name, action_name = table.preamble.name, action.preamble.name
+    action_params = {p.name: 0 for p in action.params}
+
+    start = time.perf_counter()
+    for i in range(num_entries):
+        # Exact match values that fit even the narrowest field
+        match_fields = {mf.name: i % (1 << min(mf.bitwidth, 8)) for mf in table.match_fields}
+        helper.buildTableEntry(table_name, match_fields=match_fields,
+                               action_name=action_name, action_params=action_params)
+    elapsed = time.perf_counter() - start
+    print("%s -> %s: %d entries in %.2f s, %.0f entries/s" %
+          (table_name, action_name, num_entries, elapsed, num_entries / elapsed))
+
+    template = helper.prepareTableEntry(table_name, [mf.name for mf in table.match_fields],
+                                        action_name, list(action_params))
+    param_values = list(action_params.values())
+    start = time.perf_counter()
+    for i in range(num_entries):
+        template.build([i % (1 << min(mf.bitwidth, 8)) for mf in table.match_fields], param_values)
+    elapsed = time.perf_counter() - start
+    print("%s -> %s (prepared): %d entries in %.2f s, %.0f entries/s" %
+          (table_name, action_name, num_entries, elapsed, num_entries / elapsed))
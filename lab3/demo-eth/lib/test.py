@@ -24,9 +24,18 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
     This file includes utilities for testing AllReduce results
 """
-import os, sys, csv, shutil
+import os, sys, shutil, time, tempfile
+import numpy as np
 from datetime import datetime
 
+# Data files hold one vector in .npy format, integers as int64 and floats as
+# float64 (little-endian), so they can be memory-mapped and summed with NumPy
+_INT_DTYPE   = np.dtype('<i8')
+_FLOAT_DTYPE = np.dtype('<f8')
+
+_EXPECTED_WAIT = 60      # Seconds a rank waits for another rank to write expected.bin
+_BLOCK_SIZE    = 1 << 16 # Elements summed and compared at a time
+
 def _get_or_create_test_root():
     if not os.path.exists(os.environ['APP_TEST']):
         try:
@@ -56,11 +65,80 @@ def _get_or_create_test_dir(testid):
     return d
 
 def _create_data_file(test_dir, rank, data):
-    p = os.path.join(test_dir, "data-rank-%s.csv" % rank)
-    with open(p, 'w+') as f:
-        c = csv.writer(f)
-        c.writerow(data)
-        f.flush()
+    arr = np.asarray(data)
+    arr = arr.astype(_FLOAT_DTYPE if arr.dtype.kind == 'f' else _INT_DTYPE, copy=False)
+    p = os.path.join(test_dir, "data-rank-%s.npy" % rank)
+    np.save(p, arr)
+
+def _load_data_file(p):
+    return np.load(p, mmap_mode='r')
+
+def _sum_data_files(paths, dtype, n):
+    """
+    Yield the sum of the data files in <paths>, _BLOCK_SIZE elements at a time
+    """
+    files = [_load_data_file(p) for p in paths]
+    for lo in range(0, n, _BLOCK_SIZE):
+        hi = min(lo + _BLOCK_SIZE, n)
+        accum = np.zeros(hi - lo, dtype=dtype)
+        for f in files:
+            accum += f[lo:hi]
+        yield accum
+
+def _blocks(arr):
+    for lo in range(0, len(arr), _BLOCK_SIZE):
+        yield arr[lo:lo + _BLOCK_SIZE]
+
+def _write_atomic(p, blocks):
+    tmp = "%s.%d.tmp" % (p, os.getpid())
+    with open(tmp, 'wb') as f:
+        for b in blocks:
+            b.tofile(f)
+    os.replace(tmp, p)
+
+def _get_expected(test_dir, paths, dtype, n):
+    """
+    The sum of the data files in <paths>, as blocks of _BLOCK_SIZE elements.
+    The first rank to get here computes it and writes it to
+    TEST_ROOT/test-<testid>/expected.bin, the others wait for that file and
+    memory-map it. A file older than the data files is left over from a
+    previous run and ignored
+    """
+    if n == 0:
+        return []
+    p = os.path.join(test_dir, "expected.bin")
+    lock = p + ".lock"
+    newest = max(os.path.getmtime(f) for f in paths)
+
+    def _cached():
+        try:
+            st = os.stat(p)
+        except FileNotFoundError:
+            return None
+        if st.st_mtime < newest or st.st_size != n * dtype.itemsize:
+            return None
+        return np.memmap(p, dtype=dtype, mode='r', shape=(n,))
+
+    deadline = time.time() + _EXPECTED_WAIT
+    while time.time() < deadline:
+        expected = _cached()
+        if expected is not None:
+            return _blocks(expected)
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            try:
+                if os.path.getmtime(lock) < newest: # left by a rank that died
+                    os.remove(lock)
+            except OSError:
+                pass
+            time.sleep(0.01)
+            continue
+        try:
+            _write_atomic(p, _sum_data_files(paths, dtype, n))
+        finally:
+            os.remove(lock)
+    return _sum_data_files(paths, dtype, n)
 
 def _Pass(out):
     out.write(" PASS\n")
@@ -72,7 +150,7 @@ def _get_timestamp():
     now = datetime.now()
     return '%02d:%02d:%02d.%06d' % (now.hour, now.minute, now.second, now.microsecond)
 
-def _run_test(testid, rank, data, test_fn, read_fn, write_to_file=False, num_fails=4):
+def _run_test(testid, rank, data, test_fn, dtype, write_to_file=False, num_fails=4):
     assert num_fails > 0, "num_fails must be a positive integer"
     test_dir = _get_or_create_test_dir(testid)
     if not os.path.exists(test_dir):
@@ -81,7 +159,7 @@ def _run_test(testid, rank, data, test_fn, read_fn, write_to_file=False, num_fai
     with open(os.path.join(test_dir, "result-rank-%s.txt" % rank), 'w') if write_to_file else open(sys.stdout.fileno(), 'w', closefd=False) as out:
         out.write("[+] Running test: %s, rank: %d, ts: %s\n" % (testid, rank, _get_timestamp()))
         out.write("[+] From data files:\n")
-        data_files = [f for f in os.listdir(test_dir) if os.path.isfile(os.path.join(test_dir, f)) and f.startswith("data-")]
+        data_files = [f for f in os.listdir(test_dir) if os.path.isfile(os.path.join(test_dir, f)) and f.startswith("data-") and f.endswith(".npy")]
         data_files.sort()
         if len(data_files) == 0:
             out.write("\tDid not find any data files. Stopping")
@@ -90,41 +168,44 @@ def _run_test(testid, rank, data, test_fn, read_fn, write_to_file=False, num_fai
                 out.write("\t%s\n" % os.path.join(test_dir, df))
             out.write("[+] Result:")
 
-            accum = [0] * len(data)
-
-            for df in data_files:
-                with open(os.path.join(test_dir, df), 'r+') as f:
-                    reader = csv.reader(f, delimiter=",")
-                    df_data = list(reader)
-                    assert len(list(df_data)) == 1, "Expected a single line per csv"
-                    if len(df_data[0]) != len(data):
-                        return _Fail(out, "data length missmatch with file %s" % os.path.join(test_dir, df))
-                    for i, v in enumerate(list(map(read_fn, df_data[0]))):
-                        accum[i] = accum[i] + v
-
-            failures = [i for i,v in enumerate(accum) if not test_fn(data[i], v)]
+            paths = [os.path.join(test_dir, df) for df in data_files]
+
+            for p in paths:
+                if _load_data_file(p).shape != (len(data),):
+                    return _Fail(out, "data length missmatch with file %s" % p)
+
+            # Compare block by block and stop once a failure beyond num_fails
+            # shows up, so memory stays bounded for any vector size
+            failures = []
+            lo = 0
+            for accum in _get_expected(test_dir, paths, dtype, len(data)):
+                hi = lo + len(accum)
+                block = np.asarray(data[lo:hi], dtype=dtype)
+                for i in np.flatnonzero(~test_fn(block, accum))[:num_fails + 1 - len(failures)]:
+                    failures.append((lo + i, accum[i].item(), block[i].item()))
+                if len(failures) > num_fails:
+                    break
+                lo = hi
 
             if len(failures) == 0:
                 return _Pass(out)
             else:
                 out.write("\n");
 
-            for i, idx in enumerate(failures):
-                if i == num_fails:
-                    break
-                _Fail(out, "Expected %s, got %s, at index %s\n" % (accum[idx], data[idx], idx))
+            for idx, expected, got in failures[:num_fails]:
+                _Fail(out, "Expected %s, got %s, at index %s\n" % (expected, got, idx))
 
             if len(failures) > num_fails:
-                out.write("\t...%d more failures omitted\n" % (len(failures) - num_fails))
+                out.write("\t...more failures omitted\n")
 
 ### PUBLIC API BELOW
 
 def CreateTestData(testid, rank, data):
     """
-    Create a .csv with a worker's data (AllReduce input)
+    Create a .npy with a worker's data (AllReduce input)
 
     The created file is found under:
-        TEST_ROOT/test-<testid>/data-rank-<rank>.csv
+        TEST_ROOT/test-<testid>/data-rank-<rank>.npy
 
     TEST_ROOT is controlled by os.environ['APP_TEST']
     """
@@ -136,9 +217,11 @@ def RunIntTest(testid, rank, data, num_fails=4, std_out=False):
     Run the test specififed by <testid>, on a worker with rank <rank>
 
     The test will first read all data files for the given <testid>, i.e.
-        TEST_ROOT/test-<testid>/data-*.csv
-    then it will perform a local (and slow) all-reduce to compute the
-    expected result, and finaly it will compare that with <data>
+        TEST_ROOT/test-<testid>/data-*.npy
+    then it will perform a local all-reduce to compute the expected
+    result, and finaly it will compare that with <data>
+    The expected result is computed once and shared by all ranks, see
+    TEST_ROOT/test-<testid>/expected.bin
 
     This test will perform integer comparisson on the the values
 
@@ -149,17 +232,19 @@ def RunIntTest(testid, rank, data, num_fails=4, std_out=False):
     If the test fails, up to num_fails failures will be shown
     """
     def _test_int(a, b):
-        return int(a) == int(b)
-    return _run_test(testid, rank, data, _test_int, int, not std_out, num_fails)
+        return a == b
+    return _run_test(testid, rank, data, _test_int, _INT_DTYPE, not std_out, num_fails)
 
 def RunFloatTest(testid, rank, data, tol=1e-04, num_fails=4, std_out=False):
     """
     Run the test specififed by <testid>, on a worker with rank <rank>
 
     The test will first read all data files for the given <testid>, i.e.
-        TEST_ROOT/test-<testid>/data-*.csv
-    then it will perform a local (and slow) all-reduce to compute the
-    expected result, and finaly it will compare that with <data>
+        TEST_ROOT/test-<testid>/data-*.npy
+    then it will perform a local all-reduce to compute the expected
+    result, and finaly it will compare that with <data>
+    The expected result is computed once and shared by all ranks, see
+    TEST_ROOT/test-<testid>/expected.bin
 
     This test will perform floating point comparisson on the values,
     which is done with a tolerance controlled by 'tol'
@@ -171,7 +256,30 @@ def RunFloatTest(testid, rank, data, tol=1e-04, num_fails=4, std_out=False):
 
     If the test fails, up to num_fails failures will be shown
     """
-    def _test_float(a, b, rel_tol=rel_t, abs_tol=0.0):
+    def _test_float(a, b, rel_tol=tol, abs_tol=0.0):
         # https://peps.python.org/pep-0485/#proposed-implementation
-        return abs(a-b) <= max(rel_tol * max(abs(a), abs(b)), abs_tol)
-    return _run_test(testid, rank, data, _test_float, float, not std_out, num_fails)
\ No newline at end of file
+        return np.abs(a-b) <= np.maximum(rel_tol * np.maximum(np.abs(a), np.abs(b)), abs_tol)
+    return _run_test(testid, rank, data, _test_float, _FLOAT_DTYPE, not std_out, num_fails)
+
+if __name__ == '__main__':
+    from lib.gen import GenIntArray
+    # Benchmark: python -m lib.test [num_workers] [num_elem]
+    num_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    num_elem = int(sys.argv[2]) if len(sys.argv) > 2 else 1 << 20
+    with tempfile.TemporaryDirectory() as root:
+        os.environ['APP_TEST'] = root
+        inputs = [GenIntArray(num_elem, r, seed=0) for r in range(num_workers)]
+        t = time.perf_counter()
+        for r, d in enumerate(inputs):
+            CreateTestData("bench", r, d)
+        t_create = time.perf_counter() - t
+        result = np.sum(inputs, axis=0)
+        t = time.perf_counter()
+        RunIntTest("bench", 0, result)
+        t_first = time.perf_counter() - t
+        t = time.perf_counter()
+        for r in range(1, num_workers):
+            RunIntTest("bench", r, result)
+        t_rest = time.perf_counter() - t
+        print("%d workers x %d elements: CreateTestData %.3fs (all ranks), RunIntTest %.3fs (first rank), %.3fs (other ranks)"
+              % (num_workers, num_elem, t_create, t_first, t_rest))
@@ -21,22 +21,31 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 
 
-import os, sys
+import os, sys, socket, fcntl, struct, time, atexit
 from datetime import datetime
 
+SIOCGIFADDR = 0x8915
+
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+
 def ip(iface="eth0"):
     """
     Retrieve the first ip address assigned to an interface
+    The address is looked up once per interface with an ioctl and cached
     """
-    return os.popen('ip addr show %s' % iface).read().split("inet ")[1].split("/")[0] # yeah, i know... right?
+    if iface not in ip.cache:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            req = struct.pack('256s', iface.encode()[:15])
+            ip.cache[iface] = socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFADDR, req)[20:24])
+    return ip.cache[iface]
+ip.cache = {}
 
 def rank():
     """
     Retrieve the rank of a worker, assumed to be found at sys.argv[1]
     Throws and exception if an integer cannot be parsed from sys.argv[1]
     """
-    rank.val = None
-    if rank.val == None:
+    if getattr(rank, 'val', None) == None:
         rank.val = int(sys.argv[1])
     return rank.val
 
@@ -53,11 +62,75 @@ def GetRankOrExit():
         PrintUsage()
         sys.exit(1)
 
+def _timestamp(now):
+    return ('%02d:%02d:%02d.%06d' %
+            (now.hour, now.minute, now.second, now.microsecond))
+
+class Logger:
+    """
+    Buffered, leveled logger for hot loops
+
+    A message below the logger's level costs a single comparison. Others are
+    stored unformatted with their time and written out together once
+    <capacity> messages are buffered, on Flush(), or at exit. Keyword
+    arguments are appended as key=value fields, e.g.
+        logger.Debug("acked", chunk=3, seq=19)
+    """
+    def __init__(self, level="INFO", capacity=1024, out=None):
+        self.level = LOG_LEVELS[level]
+        self.capacity = capacity
+        self.out = out or sys.stdout
+        self.buf = []
+        atexit.register(self.Flush)
+
+    def Log(self, level, *args, **fields):
+        if LOG_LEVELS[level] < self.level:
+            return
+        self.buf.append((time.time(), level, args, fields))
+        if len(self.buf) >= self.capacity:
+            self.Flush()
+
+    def Debug(self, *args, **fields):
+        if self.level <= 10:
+            self.Log("DEBUG", *args, **fields)
+
+    def Info(self, *args, **fields):
+        if self.level <= 20:
+            self.Log("INFO", *args, **fields)
+
+    def Warn(self, *args, **fields):
+        self.Log("WARN", *args, **fields)
+
+    def Error(self, *args, **fields):
+        self.Log("ERROR", *args, **fields)
+
+    def Flush(self):
+        if not self.buf:
+            return
+        addr = ip()
+        lines = []
+        for t, level, args, fields in self.buf:
+            msg = " ".join([str(a) for a in args] + ["%s=%s" % kv for kv in fields.items()])
+            lines.append("[W][%s][%s][%s] %s\n" % (addr, _timestamp(datetime.fromtimestamp(t)), level, msg))
+        self.buf.clear()
+        self.out.write("".join(lines))
+        self.out.flush()
+
+def GetLogger():
+    """
+    Retrieve the worker's shared Logger. Its level is taken from
+    os.environ['APP_LOG_LEVEL'] (DEBUG, INFO, WARN or ERROR), INFO by default
+    """
+    if GetLogger.val is None:
+        GetLogger.val = Logger(os.environ.get('APP_LOG_LEVEL', 'INFO'))
+    return GetLogger.val
+GetLogger.val = None
+
 def Log(*args):
     """
     Log a timestamped message to stdout
+    Messages buffered by the shared Logger are written first
     """
-    now = datetime.now()
-    ts = ('%02d:%02d:%02d.%06d' %
-          (now.hour, now.minute, now.second, now.microsecond))
-    print("[W][%s][%s]" % (ip(), ts), *args)
\ No newline at end of file
+    if GetLogger.val is not None:
+        GetLogger.val.Flush()
+    print("[W][%s][%s]" % (ip(), _timestamp(datetime.now())), *args)
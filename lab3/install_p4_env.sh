@@ -36,4 +36,4 @@ sudo apt-get install -y --no-install-recommends \
   p4lang-pi \
   python-is-python3
 
-sudo pip3 install -U scapy ptf psutil grpcio
\ No newline at end of file
+sudo pip3 install -U scapy ptf psutil grpcio numpy
\ No newline at end of file
@@ -12,9 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-from queue import Queue
+from queue import Queue, Full
 from abc import abstractmethod
-from datetime import datetime
+from datetime import datetime, timezone
+import random
+import threading
+import time
 
 import grpc
 from p4.v1 import p4runtime_pb2
@@ -22,6 +25,12 @@ from p4.v1 import p4runtime_pb2_grpc
 from p4.tmp import p4config_pb2
 
 MSG_LOG_MAX_LEN = 1024
+MSG_LOG_QUEUE_SIZE = 4096 # Requests waiting for the writer thread of GrpcRequestLogger
+
+# Limits of a single batched WriteRequest. gRPC rejects messages above 4 MiB by
+# default, so stay well below that and leave room for the request framing
+WRITE_BATCH_MAX_BYTES   = 1 << 20
+WRITE_BATCH_MAX_UPDATES = 1024
 
 # List of all active connections
 connections = []
@@ -33,15 +42,16 @@ def ShutdownAllSwitchConnections():
 class SwitchConnection(object):
 
     def __init__(self, name=None, address='127.0.0.1:50051', device_id=0,
-                 proto_dump_file=None):
+                 proto_dump_file=None, proto_dump_rate=1.0):
         self.name = name
         self.address = address
         self.device_id = device_id
         self.p4info = None
         self.channel = grpc.insecure_channel(self.address)
-        if proto_dump_file is not None:
-            interceptor = GrpcRequestLogger(proto_dump_file)
-            self.channel = grpc.intercept_channel(self.channel, interceptor)
+        self.request_logger = None
+        if proto_dump_file is not None and proto_dump_rate > 0:
+            self.request_logger = GrpcRequestLogger(proto_dump_file, proto_dump_rate)
+            self.channel = grpc.intercept_channel(self.channel, self.request_logger)
         self.client_stub = p4runtime_pb2_grpc.P4RuntimeStub(self.channel)
         self.requests_stream = IterableQueue()
         self.stream_msg_resp = self.client_stub.StreamChannel(iter(self.requests_stream))
@@ -55,6 +65,8 @@ class SwitchConnection(object):
     def shutdown(self):
         self.requests_stream.close()
         self.stream_msg_resp.cancel()
+        if self.request_logger is not None:
+            self.request_logger.close()
 
     def MasterArbitrationUpdate(self, dry_run=False, **kwargs):
         request = p4runtime_pb2.StreamMessageRequest()
@@ -100,6 +112,60 @@ class SwitchConnection(object):
         else:
             self.client_stub.Write(request)
 
+    def WriteTableEntries(self, table_entries, update_type=None, dry_run=False):
+        """
+        Writes many table entries with as few Write RPCs as possible. With
+        update_type None every entry is an INSERT, or a MODIFY for default
+        actions, as in WriteTableEntry
+        """
+        updates = []
+        for table_entry in table_entries:
+            update = p4runtime_pb2.Update()
+            if update_type is not None:
+                update.type = update_type
+            elif table_entry.is_default_action:
+                update.type = p4runtime_pb2.Update.MODIFY
+            else:
+                update.type = p4runtime_pb2.Update.INSERT
+            update.entity.table_entry.CopyFrom(table_entry)
+            updates.append(update)
+        return self.WriteUpdates(updates, dry_run)
+
+    def WriteUpdates(self, updates, dry_run=False):
+        """
+        Sends the updates in order, packed into WriteRequests of at most
+        WRITE_BATCH_MAX_UPDATES updates and WRITE_BATCH_MAX_BYTES bytes.
+        Returns the number of Write RPCs. On failure the indices in the error
+        details are relative to the failing request, earlier requests were
+        already applied
+        """
+        num_requests = 0
+        request = None
+        for update in updates:
+            size = update.ByteSize()
+            if request is not None and (len(request.updates) >= WRITE_BATCH_MAX_UPDATES or
+                                        request_size + size > WRITE_BATCH_MAX_BYTES):
+                self._write(request, dry_run)
+                num_requests += 1
+                request = None
+            if request is None:
+                request = p4runtime_pb2.WriteRequest()
+                request.device_id = self.device_id
+                request.election_id.low = 1
+                request_size = 0
+            request.updates.add().CopyFrom(update)
+            request_size += size
+        if request is not None:
+            self._write(request, dry_run)
+            num_requests += 1
+        return num_requests
+
+    def _write(self, request, dry_run):
+        if dry_run:
+            print("P4Runtime Write:", request)
+        else:
+            self.client_stub.Write(request)
+
     def DeleteTableEntry(self, table_entry, dry_run=False):
         request = p4runtime_pb2.WriteRequest()
         request.device_id = self.device_id
@@ -147,6 +213,21 @@ class SwitchConnection(object):
             for response in self.client_stub.Read(request):
                 yield response
 
+    def ReadMulticastGroups(self, mgid=None, dry_run=False):
+        request = p4runtime_pb2.ReadRequest()
+        request.device_id = self.device_id
+        entity = request.entities.add()
+        group = entity.packet_replication_engine_entry.multicast_group_entry
+        if mgid is not None:
+            group.multicast_group_id = mgid
+        else:
+            group.multicast_group_id = 0
+        if dry_run:
+            print("P4Runtime Read:", request)
+        else:
+            for response in self.client_stub.Read(request):
+                yield response
+
     def ReadCounters(self, counter_id=None, index=None, dry_run=False):
         request = p4runtime_pb2.ReadRequest()
         request.device_id = self.device_id
@@ -183,24 +264,61 @@ class SwitchConnection(object):
 
 class GrpcRequestLogger(grpc.UnaryUnaryClientInterceptor,
                         grpc.UnaryStreamClientInterceptor):
-    """Implementation of a gRPC interceptor that logs request to a file"""
+    """
+    Implementation of a gRPC interceptor that logs request to a file
+
+    The caller only puts the request in a bounded queue, a background thread
+    formats it and writes it to the file, which stays open. Requests that do
+    not fit in the queue are counted and skipped instead of blocking the
+    caller. With sample_rate below 1 only that fraction of the requests is
+    logged
+    """
 
-    def __init__(self, log_file):
+    def __init__(self, log_file, sample_rate=1.0, queue_size=MSG_LOG_QUEUE_SIZE):
         self.log_file = log_file
-        with open(self.log_file, 'w') as f:
-            # Clear content if it exists.
-            f.write("")
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self.queue = Queue(queue_size)
+        # Clear content if it exists.
+        self.file = open(self.log_file, 'w')
+        self.thread = threading.Thread(target=self._write_messages, name='GrpcRequestLogger', daemon=True)
+        self.thread.start()
 
     def log_message(self, method_name, body):
-        with open(self.log_file, 'a') as f:
-            ts = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-            msg = str(body)
-            f.write("\n[%s] %s\n---\n" % (ts, method_name))
-            if len(msg) < MSG_LOG_MAX_LEN:
-                f.write(str(body))
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        # The request is built for this call only, so keep a reference and
+        # leave the (expensive) text formatting to the writer thread
+        try:
+            self.queue.put_nowait((time.time(), method_name, body))
+        except Full:
+            self.dropped += 1
+
+    def _write_messages(self):
+        reported = 0
+        for ts, method_name, body in iter(self.queue.get, None):
+            if self.dropped != reported:
+                self.file.write("\n%d requests not logged, the queue was full\n" % (self.dropped - reported))
+                reported = self.dropped
+            ts = datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+            self.file.write("\n[%s] %s\n---\n" % (ts, method_name))
+            # The text format is longer than the binary one, so large requests
+            # such as the pipeline config are skipped without formatting them
+            msg = str(body) if body.ByteSize() < MSG_LOG_MAX_LEN else None
+            if msg is not None and len(msg) < MSG_LOG_MAX_LEN:
+                self.file.write(msg)
             else:
-                f.write("Message too long (%d bytes)! Skipping log...\n" % len(msg))
-            f.write('---\n')
+                self.file.write("Message too long (%d bytes)! Skipping log...\n" %
+                                (len(msg) if msg is not None else body.ByteSize()))
+            self.file.write('---\n')
+            if self.queue.empty():
+                self.file.flush()
+        self.file.close()
+
+    def close(self):
+        """Writes out the queued requests and closes the file"""
+        self.queue.put(None)
+        self.thread.join()
 
     def intercept_unary_unary(self, continuation, client_call_details, request):
         self.log_message(client_call_details.method, request)
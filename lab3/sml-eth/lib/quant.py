@@ -0,0 +1,132 @@
+"""
+Copyright (c) 2025 Computer Networks Group @ UPB
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+"""
+    Block floating point quantization, to all-reduce floats on a switch that
+    can only sum integers
+
+    Every chunk is scaled by a power of two shared by all workers (the chunk's
+    shared exponent) and rounded to a 32-bit fixed-point integer. The switch
+    sums those integers and the workers scale the sums back.
+"""
+
+import numpy as np
+
+EXP_BIAS  = 8   # Chunk maxima in [2^-8, 2^15) are represented exactly in the exponent round
+EXP_MAX   = 23  # Highest exponent bit, leaves 8 bits to sum up to 256 workers
+FRAC_BITS = 30  # Quantized sums stay below 2^30 in magnitude
+
+def _to_lanes(q):
+    """ int64 array -> list of uint32 values (two's complement) """
+    return (q & 0xffffffff).astype(np.uint32).tolist()
+
+def _from_lanes(lanes):
+    """
+    list of 32-bit values -> int32 array. Lanes may come back signed or
+    unsigned, so they are masked before the cast (NumPy 2 rejects negative
+    values for uint32)
+    """
+    return (np.asarray(lanes, dtype=np.int64) & 0xffffffff).astype(np.uint32).view(np.int32)
+
+def _pad(lanes, multiple):
+    return lanes + [0] * (-len(lanes) % multiple)
+
+def ExponentLanes(data, chunk_size):
+    """
+    Encode the exponent e of each chunk's largest magnitude (|x| < 2^e) as
+    2^(e + EXP_BIAS). The sum of these over all workers is at least the
+    largest encoding and at most num_workers times it, which is exactly the
+    headroom the quantized sum needs
+    """
+    x = np.asarray(data, dtype=np.float64).reshape(-1, chunk_size)
+    _, e = np.frexp(np.abs(x).max(axis=1))
+    e = e.astype(np.int64) + EXP_BIAS
+    if (e > EXP_MAX).any():
+        raise ValueError("values of magnitude 2^%d or more cannot be quantized" % (EXP_MAX - EXP_BIAS))
+    return np.left_shift(1, np.clip(e, 0, EXP_MAX)).astype(np.int64)
+
+def SharedExponents(lanes_sum):
+    """
+    Turn the all-reduced exponent lanes into the shared exponent E of every
+    chunk, such that the magnitude of the chunk's sum is below 2^E
+    """
+    _, bits = np.frexp(np.asarray(lanes_sum, dtype=np.float64))
+    return bits.astype(np.int64) - EXP_BIAS
+
+def Quantize(data, exps, chunk_size):
+    """
+    Scale each chunk of data by 2^(FRAC_BITS - E) and round to integers
+    """
+    x = np.asarray(data, dtype=np.float64).reshape(-1, chunk_size)
+    scale = np.ldexp(1.0, FRAC_BITS - exps)[:, None]
+    return np.rint(x * scale).astype(np.int64).ravel()
+
+def Dequantize(q, exps, chunk_size):
+    """
+    Inverse of Quantize() for the summed integers
+    """
+    x = np.asarray(q, dtype=np.float64).reshape(-1, chunk_size)
+    return (x * np.ldexp(1.0, exps - FRAC_BITS)[:, None]).ravel()
+
+def AllReduceFloat(all_reduce, data, result, chunk_size):
+    """
+    Perform a float all-reduce with an integer all-reduce
+
+    :param   all_reduce: function all_reduce(data, result) summing integer vectors
+    :param [float] data: the input vector for this worker
+    :param [float]  res: the output vector
+    :param   chunk_size: elements per packet, len(data) must be a multiple of it
+
+    Takes two all-reduce calls: one to agree on a shared exponent per chunk,
+    one for the quantized values. The first one carries one value per chunk
+    """
+    num_chunks = len(data) // chunk_size
+
+    lanes = _pad(_to_lanes(ExponentLanes(data, chunk_size)), chunk_size)
+    lanes_sum = [0] * len(lanes)
+    all_reduce(lanes, lanes_sum)
+    exps = SharedExponents(lanes_sum[:num_chunks])
+
+    q_sum = [0] * len(data)
+    all_reduce(_to_lanes(Quantize(data, exps, chunk_size)), q_sum)
+    result[:] = Dequantize(_from_lanes(q_sum), exps, chunk_size).tolist()
+
+if __name__ == '__main__':
+    # Lanes round trip, given as uint32 or as negative int32 values
+    q = np.array([-2**31, -5, -1, 0, 1, 2**31 - 1], dtype=np.int64)
+    assert (_from_lanes(_to_lanes(q)) == q).all()
+    assert (_from_lanes(q.tolist()) == q).all()
+
+    # Float all-reduce of two workers with negative inputs, summing the
+    # lanes as a switch would (modulo 2^32)
+    def all_reduce(data, result, others):
+        result[:] = [(a + b) & 0xffffffff for a, b in zip(data, others.pop(0))]
+
+    chunk_size = 4
+    a = [-1.5, -0.25, 3.0, -7.75, -100.0, 0.5, -0.125, 2.0]
+    b = [0.5, -0.75, -3.0, -0.25, 50.0, -2.5, -0.375, -2.0]
+    others = [_pad(_to_lanes(ExponentLanes(b, chunk_size)), chunk_size)]
+    exps = SharedExponents(ExponentLanes(a, chunk_size) + ExponentLanes(b, chunk_size))
+    others.append(_to_lanes(Quantize(b, exps, chunk_size)))
+    result = [0.0] * len(a)
+    AllReduceFloat(lambda d, r: all_reduce(d, r, others), a, result, chunk_size)
+    assert np.allclose(result, np.add(a, b))
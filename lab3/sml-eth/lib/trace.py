@@ -0,0 +1,120 @@
+"""
+Copyright (c) 2025 Computer Networks Group @ UPB
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+"""
+    Per-chunk event tracing for AllReduce, exported as a Chrome trace timeline
+    (open in chrome://tracing or https://ui.perfetto.dev)
+"""
+
+import os, json, time, atexit
+import numpy as np
+from lib.worker import rank
+
+# Events
+SEND       = 0
+RECV       = 1
+RETRANSMIT = 2
+
+class Tracer:
+    """
+    Records (time, event, chunk, slot) into preallocated arrays, timed with
+    perf_counter_ns. Once <capacity> events are recorded further ones are
+    counted but dropped
+
+    Dump() writes one span per chunk from its first transmission to its
+    result, on the row of its slot, with retransmissions as instant events
+    """
+    def __init__(self, rank, capacity=1 << 20):
+        self.rank = rank
+        self.t = np.zeros(capacity, dtype=np.int64)
+        self.event = np.zeros(capacity, dtype=np.int8)
+        self.chunk = np.zeros(capacity, dtype=np.int64)
+        self.slot = np.zeros(capacity, dtype=np.int32)
+        self.n = 0
+        self.dropped = 0
+        # perf_counter_ns is only meaningful within a process, the wall
+        # clock at creation lines the timelines of all ranks up
+        self.t0 = time.perf_counter_ns()
+        self.wall0 = time.time_ns()
+
+    def Record(self, event, chunk, slot=0):
+        n = self.n
+        if n == len(self.t):
+            self.dropped += 1
+            return
+        self.t[n] = time.perf_counter_ns()
+        self.event[n] = event
+        self.chunk[n] = chunk
+        self.slot[n] = slot
+        self.n = n + 1
+
+    def _us(self, t):
+        return (self.wall0 + int(t) - self.t0) / 1000
+
+    def Events(self):
+        """
+        The recorded events in Chrome trace event format
+        """
+        pid = self.rank
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "rank %d" % pid}}]
+        slots = set()
+        open_ = {} # (chunk, slot) -> [start, retransmissions]
+        for i in range(self.n):
+            t, ev, chunk, slot = self.t[i], self.event[i], int(self.chunk[i]), int(self.slot[i])
+            key = (chunk, slot)
+            slots.add(slot)
+            if ev == SEND:
+                open_[key] = [t, 0]
+            elif ev == RETRANSMIT:
+                if key in open_:
+                    open_[key][1] += 1
+                events.append({"name": "retransmit", "ph": "i", "s": "t", "ts": self._us(t),
+                               "pid": pid, "tid": slot, "args": {"chunk": chunk}})
+            elif ev == RECV and key in open_:
+                start, retransmits = open_.pop(key)
+                events.append({"name": "chunk %d" % chunk, "ph": "X", "ts": self._us(start),
+                               "dur": (t - start) / 1000, "pid": pid, "tid": slot,
+                               "args": {"chunk": chunk, "retransmits": retransmits}})
+        for slot in sorted(slots):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": slot, "args": {"name": "slot %d" % slot}})
+        return events
+
+    def Dump(self, path=None):
+        """
+        Write the timeline to <path>, by default APP_LOGS/trace-rank-<rank>.json
+        """
+        if path is None:
+            path = os.path.join(os.environ['APP_LOGS'], "trace-rank-%d.json" % self.rank)
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": self.Events(), "otherData": {"dropped": self.dropped}}, f)
+
+def GetTracer():
+    """
+    Retrieve the worker's shared Tracer, or None if tracing is off. Tracing is
+    on if os.environ['APP_TRACE'] is set to a non-zero value, the timeline is
+    written to APP_LOGS at exit
+    """
+    if GetTracer.val is None and os.environ.get('APP_TRACE', '0') not in ('', '0'):
+        GetTracer.val = Tracer(rank())
+        atexit.register(GetTracer.val.Dump)
+    return GetTracer.val
+GetTracer.val = None
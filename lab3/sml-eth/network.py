@@ -23,15 +23,38 @@ from lib import config # do not import anything before this
 from p4app import P4Mininet
 from mininet.topo import Topo
 from mininet.cli import CLI
+from lib.daemon import Request
 import os
 
-NUM_WORKERS = 2 # TODO: Make sure your program can handle larger values
+NUM_WORKERS = 2   # TODO: Make sure your program can handle larger values
+POOL_SIZE   = 16  # Aggregation slots in use, at most MAX_SLOTS in p4/main.p4
+DAEMON      = False # Keep the workers running between runs, see StartWorkers()
+
+# Registers holding the aggregation state, see TheIngress in p4/main.p4
+SML_REGISTERS = ["agg_values", "agg_count"]
+
+# Simple logic to allocate IP and MAC addresses based on the worker ID
+def getWorkerIP(wid):
+    return "10.0.0.%d" % (wid + 1)
+
+def getWorkerMAC(wid):
+    return "00:00:00:00:01:%02x" % (wid + 1)
 
 class SMLTopo(Topo):
-    def __init__(self, **opts):
+    def __init__(self, num_workers=NUM_WORKERS, **opts):
         Topo.__init__(self, **opts)
-        # TODO: Implement me. Feel free to modify the constructor signature
         # NOTE: Make sure worker names are consistent with RunWorkers() below
+        sw = self.addSwitch('s1')
+        for i in range(num_workers):
+            worker = self.addHost('w%d' % i, ip=getWorkerIP(i), mac=getWorkerMAC(i))
+            self.addLink(worker, sw, port2=i)
+
+def ResetSwitchState(net):
+    """
+    Clear the aggregation registers, so partial sums of an aborted run do not
+    end up in the next one
+    """
+    net.get('s1').commands(['register_reset TheIngress.%s' % r for r in SML_REGISTERS], quiet=True)
 
 def RunWorkers(net):
     """
@@ -40,6 +63,9 @@ def RunWorkers(net):
     This function assumes worker i is named 'w<i>'. Feel free to modify it
     if your naming scheme is different
     """
+    ResetSwitchState(net)
+    if getattr(net, 'daemons', 0):
+        return Request(range(net.daemons), [])
     worker = lambda rank: "w%i" % rank
     log_file = lambda rank: os.path.join(os.environ['APP_LOGS'], "%s.log" % worker(rank))
     for i in range(NUM_WORKERS):
@@ -47,18 +73,69 @@ def RunWorkers(net):
     for i in range(NUM_WORKERS):
         net.get(worker(i)).waitOutput()
 
+def StartWorkers(net, num_workers=NUM_WORKERS):
+    """
+    Start the workers as daemons (see lib/daemon.py). Until StopWorkers(),
+    RunWorkers() hands every run to them instead of starting new processes
+    """
+    worker = lambda rank: "w%i" % rank
+    log_file = lambda rank: os.path.join(os.environ['APP_LOGS'], "%s.log" % worker(rank))
+    for i in range(num_workers):
+        net.get(worker(i)).cmd('python worker.py %d daemon > %s 2>&1 &' % (i, log_file(i)))
+    net.daemons = num_workers
+
+def StopWorkers(net):
+    if getattr(net, 'daemons', 0):
+        Request(range(net.daemons), ["exit"])
+        net.daemons = 0
+
 def RunControlPlane(net):
     """
     One-time control plane configuration
+
+    The worker count and the number of slots in use are runtime parameters of
+    the P4 program, so neither needs a recompilation
     """
-    # TODO: Implement me (if needed)
-    pass
+    assert NUM_WORKERS < 256, "contribution counters are 8 bits wide"
+    sw = net.get('s1')
+
+    # Only what changed since the last run goes out, in one Write request
+    # when the block exits, so the control plane can be run again
+    with sw.reconcile():
+        sw.insertTableEntry(table_name='TheIngress.sml_config',
+                            default_action=True,
+                            action_name='TheIngress.set_sml_config',
+                            action_params={'num_workers': NUM_WORKERS, 'pool_size': POOL_SIZE})
+
+        for i in range(NUM_WORKERS):
+            # Plain L2 forwarding for everything that is not SwitchML
+            sw.insertTableEntry(table_name='TheIngress.ethernet_table',
+                                match_fields={'hdr.eth.dstAddr': getWorkerMAC(i)},
+                                action_name='TheIngress.l2_forward',
+                                action_params={'port': i})
+            # Results leaving on port i are addressed to worker i
+            sw.insertTableEntry(table_name='TheEgress.sml_result_dst',
+                                match_fields={'standard_metadata.egress_port': i},
+                                action_name='TheEgress.set_worker_dst',
+                                action_params={'mac': getWorkerMAC(i)})
+
+        sw.insertTableEntry(table_name='TheIngress.ethernet_table',
+                            match_fields={'hdr.eth.dstAddr': 'ff:ff:ff:ff:ff:ff'},
+                            action_name='TheIngress.multicast',
+                            action_params={'mgid': 1})
+        # Group 1 is used for broadcasts and for results (SML_MGID in p4/main.p4)
+        sw.addMulticastGroup(mgid=1, ports=range(NUM_WORKERS))
 
-topo = None # TODO: Create an SMLTopo instance
+topo = SMLTopo()
 net = P4Mininet(program="p4/main.p4", topo=topo)
 net.run_control_plane = lambda: RunControlPlane(net)
 net.run_workers = lambda: RunWorkers(net)
+net.start_workers = lambda: StartWorkers(net)
+net.stop_workers = lambda: StopWorkers(net)
 net.start()
 net.run_control_plane()
+if DAEMON:
+    StartWorkers(net)
 CLI(net)
+StopWorkers(net)
 net.stop()
\ No newline at end of file
@@ -19,45 +19,158 @@
  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
  """
 
-from lib.gen import GenInts, GenMultipleOfInRange
-from lib.test import CreateTestData, RunIntTest
+from lib.gen import GenInts, GenFloats, GenMultipleOfInRange
+from lib.test import CreateTestData, RunIntTest, RunFloatTest
+from lib.quant import AllReduceFloat
+from lib.trace import GetTracer, SEND, RECV
+from lib.daemon import Serve
 from lib.worker import *
-from scapy.all import Packet
+import socket
+import struct
+import sys
 
 NUM_ITER   = 1     # TODO: Make sure your program can handle larger values
-CHUNK_SIZE = None  # TODO: Define me
+FLOAT_ITER = 1     # Float iterations, quantized per chunk (see lib/quant.py)
+CHUNK_SIZE = 32    # Elements per packet, must match CHUNK_SIZE in p4/main.p4
+NUM_SLOTS  = 16    # Chunks in flight, must not exceed POOL_SIZE in network.py
 
-class SwitchML(Packet):
-    name = "SwitchMLPacket"
-    fields_desc = [
-        # TODO: Implement me
-    ]
+SML_ETHERTYPE = 0x88b5
+SWITCH_MAC    = "00:00:00:00:02:fe"
 
-def AllReduce(iface, rank, data, result):
+class SwitchML:
+    """
+    SwitchML header followed by CHUNK_SIZE values, see p4/main.p4
+
+    Packed and parsed with struct, so the hot path does not need scapy.
+    Show() prints the scapy dissection for debugging
+    """
+    __slots__ = ("rank", "slot", "chunk", "vals")
+    HEADER = struct.Struct("!BHI")
+    VALS   = struct.Struct("!%dI" % CHUNK_SIZE)
+
+    def __init__(self, rank=0, slot=0, chunk=0, vals=()):
+        self.rank, self.slot, self.chunk = rank, slot, chunk
+        self.vals = vals
+
+    def __bytes__(self):
+        return self.HEADER.pack(self.rank, self.slot, self.chunk) + self.VALS.pack(*self.vals)
+
+    @classmethod
+    def parse(cls, buf, offset=0):
+        pkt = cls(*cls.HEADER.unpack_from(buf, offset))
+        pkt.vals = list(cls.VALS.unpack_from(buf, offset + cls.HEADER.size))
+        return pkt
+
+    def Show(self):
+        ScapySwitchML()(bytes(self)).show()
+
+def ScapySwitchML():
+    """
+    The header as a scapy layer. scapy is slow to import, so this happens
+    on first use only
+    """
+    if ScapySwitchML.cls is None:
+        from scapy.all import Packet, ByteField, ShortField, IntField, FieldListField
+        from scapy.all import Ether, bind_layers
+        class SwitchMLPacket(Packet):
+            name = "SwitchMLPacket"
+            fields_desc = [
+                ByteField("rank", 0),
+                ShortField("slot", 0),
+                IntField("chunk", 0),
+                FieldListField("vals", [], IntField("", 0), count_from=lambda pkt: CHUNK_SIZE),
+            ]
+        bind_layers(Ether, SwitchMLPacket, type=SML_ETHERTYPE)
+        ScapySwitchML.cls = SwitchMLPacket
+    return ScapySwitchML.cls
+ScapySwitchML.cls = None
+
+def _mac(addr):
+    return bytes.fromhex(addr.replace(":", ""))
+
+def AllReduce(soc, rank, data, result):
     """
     Perform in-network all-reduce over ethernet
 
-    :param str  iface: the ethernet interface used for all-reduce
+    :param str    soc: the raw socket used for all-reduce, see OpenSocket()
     :param int   rank: the worker's rank
     :param [int] data: the input vector for this worker
     :param [int]  res: the output vector
 
     This function is blocking, i.e. only returns with a result or error
+
+    Chunk i is aggregated in slot i % NUM_SLOTS. The next chunk of a slot is
+    only sent once the result of the previous one arrived, at which point the
+    switch has already emptied the slot.
     """
-    # TODO: Implement me
-    pass
+    num_chunks = len(data) // CHUNK_SIZE
+    switch_mac = _mac(SWITCH_MAC)
+    # The address the socket is bound to carries the interface's MAC
+    eth = switch_mac + soc.getsockname()[4] + struct.pack("!H", SML_ETHERTYPE)
+    tracer = GetTracer()
 
-def main():
-    iface = 'eth0'
-    rank = GetRankOrExit()
-    Log("Started...")
+    def send_chunk(chunk):
+        soc.send(eth + bytes(SwitchML(rank=rank, slot=chunk % NUM_SLOTS, chunk=chunk,
+                                      vals=data[chunk * CHUNK_SIZE:(chunk + 1) * CHUNK_SIZE])))
+        if tracer:
+            tracer.Record(SEND, chunk, chunk % NUM_SLOTS)
+
+    for chunk in range(min(NUM_SLOTS, num_chunks)):
+        send_chunk(chunk)
+
+    received = 0
+    while received < num_chunks:
+        frame = soc.recv(2048)
+        # The socket also sees our own packets, results come from the switch
+        if frame[6:12] != switch_mac:
+            continue
+        pkt = SwitchML.parse(frame, 14)
+        chunk = pkt.chunk
+        if tracer:
+            tracer.Record(RECV, chunk, chunk % NUM_SLOTS)
+        result[chunk * CHUNK_SIZE:(chunk + 1) * CHUNK_SIZE] = pkt.vals
+        received += 1
+        if chunk + NUM_SLOTS < num_chunks:
+            send_chunk(chunk + NUM_SLOTS)
+
+def OpenSocket(iface):
+    """
+    Open a raw socket for SwitchML frames on the ethernet interface <iface>
+    """
+    soc = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(SML_ETHERTYPE))
+    soc.bind((iface, 0))
+    return soc
+
+def RunTests(soc, rank):
     for i in range(NUM_ITER):
         num_elem = GenMultipleOfInRange(2, 2048, 2 * CHUNK_SIZE) # You may want to 'fix' num_elem for debugging
         data_out = GenInts(num_elem)
         data_in = GenInts(num_elem, 0)
         CreateTestData("eth-iter-%d" % i, rank, data_out)
-        AllReduce(iface, rank, data_out, data_in)
+        AllReduce(soc, rank, data_out, data_in)
         RunIntTest("eth-iter-%d" % i, rank, data_in, True)
+    for i in range(FLOAT_ITER):
+        num_elem = GenMultipleOfInRange(2, 2048, 2 * CHUNK_SIZE, seed=4242 + i)
+        data_out = GenFloats(num_elem)
+        data_in = GenFloats(num_elem, 0)
+        CreateTestData("eth-float-iter-%d" % i, rank, data_out)
+        AllReduceFloat(lambda d, r: AllReduce(soc, rank, d, r), data_out, data_in, CHUNK_SIZE)
+        RunFloatTest("eth-float-iter-%d" % i, rank, data_in, std_out=True)
+
+def main():
+    iface = 'eth0'
+    rank = GetRankOrExit()
+    Log("Started...")
+    s = OpenSocket(iface)
+    # NOTE: This socket will be used for all AllReduce calls, also those of
+    #       every run a daemon serves
+
+    # python worker.py <rank> [daemon]
+    if sys.argv[2:3] == ["daemon"]:
+        Serve(rank, lambda args: RunTests(s, rank))
+    else:
+        RunTests(s, rank)
+    s.close()
     Log("Done")
 
 if __name__ == '__main__':
@@ -21,6 +21,7 @@
 
 
 
+import asyncio
 import socket
 import random
 import time
@@ -61,4 +62,36 @@ def unreliable_receive(soc, nbytes, p=0.3):
     res = soc.recvfrom(nbytes)
     if p and random.random() < p:
         raise socket.timeout
-    return res
\ No newline at end of file
+    return res
+
+def transport_send(transport, data, addr):
+    """ Send `data` to `addr` using the asyncio datagram transport `transport` """
+    transport.sendto(data, addr)
+
+def transport_receive(data, addr):
+    """
+    Filter a datagram `data` from `addr` delivered to an asyncio protocol
+    Returns the datagram, or None if it is to be dropped
+    """
+    return data
+
+def unreliable_transport_send(transport, data, addr, sleep=2, p=0.3):
+    """
+    Like unreliable_send(), for the asyncio datagram transport `transport`
+    A delayed packet is sent later by the event loop, which keeps running
+    """
+    if p and random.random() < p:
+        if sleep < 1:
+            return
+        asyncio.get_running_loop().call_later(sleep, transport.sendto, data, addr)
+        return
+    transport.sendto(data, addr)
+
+def unreliable_transport_receive(data, addr, p=0.3):
+    """
+    Like unreliable_receive(), for a datagram delivered to an asyncio protocol
+    Returns None with probability 'p', effectively "dropping" the packet
+    """
+    if p and random.random() < p:
+        return None
+    return data
@@ -0,0 +1,94 @@
+"""
+Copyright (c) 2025 Computer Networks Group @ UPB
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+
+"""
+    Persistent workers. A worker started with `python worker.py <rank> daemon`
+    serves runs requested over a unix socket in APP_LOGS, so repeated runs do
+    not pay for interpreter start, imports and socket setup every time
+"""
+
+import os, json, socket, time
+
+def ControlPath(rank):
+    return os.path.join(os.environ['APP_LOGS'], "worker-%d.sock" % rank)
+
+def Serve(rank, run):
+    """
+    Call run(args) for every request on the control socket of <rank>, until
+    the request ["exit"] arrives. <args> are the arguments that follow the
+    rank on the command line of worker.py, e.g. [] or ["bench", ...]
+    """
+    path = ControlPath(rank)
+    if os.path.exists(path):
+        os.remove(path)
+    ctl = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    ctl.bind(path)
+    ctl.listen()
+    try:
+        while True:
+            conn, _ = ctl.accept()
+            with conn, conn.makefile('rw') as f:
+                args = json.loads(f.readline())
+                reply = {"ok": True}
+                if args != ["exit"]:
+                    # Also SystemExit from worker code, the daemon must answer
+                    # and keep serving. Ctrl-C still stops it
+                    try:
+                        run(args)
+                    except (Exception, SystemExit) as e:
+                        reply = {"ok": False, "error": repr(e)}
+                f.write(json.dumps(reply) + "\n")
+            if args == ["exit"]:
+                return
+    finally:
+        ctl.close()
+        os.remove(path)
+
+def _connect(rank, timeout):
+    deadline = time.time() + timeout
+    while True:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.connect(ControlPath(rank))
+            return s
+        except (FileNotFoundError, ConnectionRefusedError):
+            s.close()
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+def Request(ranks, args, timeout=60):
+    """
+    Hand <args> to the workers with the given ranks and wait until all of
+    them are done. Waits up to <timeout> seconds for a worker that is still
+    starting. Raises RuntimeError if a worker failed
+    """
+    conns = [_connect(r, timeout) for r in ranks]
+    for c in conns:
+        c.sendall((json.dumps(list(args)) + "\n").encode())
+    replies = []
+    for c in conns:
+        with c, c.makefile('r') as f:
+            replies.append(json.loads(f.readline() or '{"ok": false, "error": "no reply"}'))
+    for r, reply in zip(ranks, replies):
+        if not reply["ok"]:
+            raise RuntimeError("worker %d: %s" % (r, reply["error"]))
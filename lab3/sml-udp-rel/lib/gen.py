@@ -24,6 +24,7 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 import random
+import numpy as np
 
 MAX_INT_VAL = 0xffff
 MAX_FLOAT_VAL = 1
@@ -33,29 +34,58 @@ def GenMultipleOfInRange(lo=2, hi=2048, multiple=1, seed=42):
     Generate a random integer in range [lo, hi] that is a multiple of 'multiple'
     If the range is not correct, it will be 'fixed' to make sure that:
         multiple <= lo <= hi
-    By default the function passes `seed` to the RNG and then resets it. Which is useful
+    By default the function draws from an RNG seeded with `seed`. Which is useful
     for generating the same random number across workers etc.
+    The global RNG of the random module is not touched
     """
     if lo < multiple:
         lo = multiple
     if hi <= lo:
         hi = lo
-    random.seed(seed)
-    n = random.randint(lo, hi)
-    random.seed(None)
+    n = random.Random(seed).randint(lo, hi)
     res = multiple * round(n / multiple)
     return res + multiple if res < lo or res > hi else res
 
-def GenInts(n=1, unique=None):
+def GenInts(n=1, unique=None, rank=0, seed=None):
     """
-    Generate n random integers in range [0, MAX_INT_VAL]
+    Generate a list of n random integers in range [0, MAX_INT_VAL]
     if unique is not None, all elements have the value unique
+    List version of GenIntArray(), values may repeat
     """
-    return [unique] * n if unique is not None else random.sample(range(0, MAX_INT_VAL), n)
+    return GenIntArray(n, rank, seed, unique).tolist()
 
-def GenFloats(n=1, unique=None):
+def GenFloats(n=1, unique=None, rank=0, seed=None):
     """
-    Generate n random floats in range [0, MAX_FLOAT_VAL]
+    Generate a list of n random floats in range [0, MAX_FLOAT_VAL]
     if unique is not None, all elements have the value unique
+    List version of GenFloatArray()
     """
-    return [float(unique)] * n if unique is not None else [random.uniform(0, MAX_FLOAT_VAL) for i in range(n)]
\ No newline at end of file
+    return GenFloatArray(n, rank, seed, unique).tolist()
+
+def GenRNG(rank=0, seed=None):
+    """
+    Create a NumPy generator on its own PCG64 stream for the worker with rank <rank>
+    Workers passing the same seed get independent but reproducible streams,
+    seed=None draws fresh entropy
+    """
+    return np.random.Generator(np.random.PCG64(np.random.SeedSequence(seed, spawn_key=(rank,))))
+
+def GenIntArray(n=1, rank=0, seed=None, unique=None, dtype=np.uint32):
+    """
+    Generate an array of n random integers in range [0, MAX_INT_VAL]
+    if unique is not None, all elements have the value unique
+    Values may repeat, so n is not limited by the range. The default dtype
+    is that of the switch's aggregation lanes
+    """
+    if unique is not None:
+        return np.full(n, unique, dtype=dtype)
+    return GenRNG(rank, seed).integers(0, MAX_INT_VAL, n, dtype=dtype, endpoint=True)
+
+def GenFloatArray(n=1, rank=0, seed=None, unique=None, dtype=np.float64):
+    """
+    Generate an array of n random floats in range [0, MAX_FLOAT_VAL]
+    if unique is not None, all elements have the value unique
+    """
+    if unique is not None:
+        return np.full(n, unique, dtype=dtype)
+    return GenRNG(rank, seed).uniform(0, MAX_FLOAT_VAL, n).astype(dtype, copy=False)
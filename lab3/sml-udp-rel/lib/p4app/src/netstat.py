@@ -13,9 +13,36 @@
 # limitations under the License.
 #
 
-import psutil
-def check_listening_on_port(port):
-    for c in psutil.net_connections(kind='inet'):
-        if c.status == 'LISTEN' and c.laddr[1] == port:
+import socket
+import time
+
+PROBE_TIMEOUT = 0.1  # seconds per connect attempt
+BACKOFF_MIN   = 0.01 # seconds between the first attempts, doubled after each round
+BACKOFF_MAX   = 0.2
+
+def check_listening_on_port(port, host='127.0.0.1'):
+    """
+    Tries to connect to the port instead of enumerating every inet socket of
+    the host. A refused connection on the loopback fails right away
+    """
+    try:
+        with socket.create_connection((host, port), timeout=PROBE_TIMEOUT):
+            return True
+    except OSError:
+        return False
+
+def wait_for_port(port, timeout, alive=lambda: True, host='127.0.0.1'):
+    """
+    Waits until something listens on port, probing with a backoff from
+    BACKOFF_MIN to BACKOFF_MAX. Returns False after the timeout or once
+    alive() tells that the process that should open it has died
+    """
+    deadline = time.monotonic() + timeout
+    delay = BACKOFF_MIN
+    while True:
+        if check_listening_on_port(port, host):
             return True
-    return False
+        if not alive() or time.monotonic() >= deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, BACKOFF_MAX)
@@ -1,5 +1,14 @@
+import hashlib
 import os
-from p4app_util import run_command, get_logs_directory, get_root_directory
+import re
+import shutil
+import tempfile
+from p4app_util import log, run_command, get_logs_directory, get_root_directory
+
+COMPILER = 'p4c-bm2-ss'
+CACHE_DIR = 'p4c-cache' # Compiled programs by hash of their inputs, in the logs dir
+
+include_pattern = re.compile(r'^\s*#\s*include\s+"([^"]+)"', re.MULTILINE)
 
 class P4Program:
 
@@ -23,6 +32,39 @@ class P4Program:
     def name(self):
         return os.path.basename(self.prog_filename).rstrip('.p4')
 
+    def sources(self):
+        """
+        The program file and every file it includes with #include "...",
+        recursively. System includes (<core.p4> etc.) belong to the compiler
+        """
+        files, pending = [], [self.prog_filename]
+        while pending:
+            path = pending.pop()
+            if path in files or not os.path.isfile(path):
+                continue
+            files.append(path)
+            with open(path) as f:
+                for inc in include_pattern.findall(f.read()):
+                    pending.append(os.path.normpath(os.path.join(os.path.dirname(path), inc)))
+        return files
+
+    def cacheKey(self, compiler_args):
+        """
+        Hash of everything the output depends on: the compiler binary, its
+        arguments and the content of the sources
+        """
+        h = hashlib.sha256()
+        compiler = shutil.which(COMPILER)
+        if compiler is not None:
+            st = os.stat(compiler)
+            h.update(('%s %d %d\n' % (compiler, st.st_size, st.st_mtime_ns)).encode())
+        h.update((' '.join(compiler_args) + '\n').encode())
+        for path in self.sources():
+            h.update((path + '\n').encode())
+            with open(path, 'rb') as f:
+                h.update(hashlib.sha256(f.read()).digest())
+        return h.hexdigest()
+
     def compile(self):
         compiler_args = []
 
@@ -30,19 +72,41 @@ class P4Program:
 
         compiler_args.extend(self.compile_flags)
 
-        # Compile the program.
+        # Compile the program, unless the cache has a build of the same
+        # inputs, and copy the outputs to the logs dir
         # self._json_path = os.path.join('/tmp/p4app-logs', self.name() + '.json')
-        self._json_path = os.path.join(get_logs_directory(), self.name() + '.json')
-        compiler_args.append('"%s"' % self.prog_filename)
-        compiler_args.append('-o "%s"' % self._json_path)
-        if self.supportsP4Runtime():
-            # self._p4info_path = os.path.join('/tmp/p4app-logs', self.name() + '.p4info.txt')
-            self._p4info_path = os.path.join(get_logs_directory(), self.name() + '.p4info.txt')
-            compiler_args.append('--p4runtime-files "%s"' % self._p4info_path)
-        rv = run_command('p4c-bm2-ss %s' % ' '.join(compiler_args))
+        json_name = self.name() + '.json'
+        p4info_name = self.name() + '.p4info.txt'
+        outputs = [json_name] + ([p4info_name] if self.supportsP4Runtime() else [])
+        cache_dir = os.path.join(get_logs_directory(), CACHE_DIR, self.cacheKey(compiler_args))
 
-        if rv != 0:
-            raise Exception("Compile failed. Compiler return value: %d" % rv)
+        if os.path.isdir(cache_dir):
+            log('> using cached build of %s (%s)' % (self.prog_filename, cache_dir))
+        else:
+            os.makedirs(os.path.dirname(cache_dir), exist_ok=True)
+            build_dir = tempfile.mkdtemp(dir=os.path.dirname(cache_dir))
+            compiler_args.append('"%s"' % self.prog_filename)
+            compiler_args.append('-o "%s"' % os.path.join(build_dir, json_name))
+            if self.supportsP4Runtime():
+                # self._p4info_path = os.path.join('/tmp/p4app-logs', self.name() + '.p4info.txt')
+                compiler_args.append('--p4runtime-files "%s"' % os.path.join(build_dir, p4info_name))
+            rv = run_command('%s %s' % (COMPILER, ' '.join(compiler_args)))
+
+            if rv != 0:
+                shutil.rmtree(build_dir, ignore_errors=True)
+                raise Exception("Compile failed. Compiler return value: %d" % rv)
+            # Publish the build at once, a concurrent compile of the same
+            # inputs may have won the race, its build is just as good
+            try:
+                os.rename(build_dir, cache_dir)
+            except OSError:
+                shutil.rmtree(build_dir, ignore_errors=True)
+
+        for name in outputs:
+            shutil.copyfile(os.path.join(cache_dir, name), os.path.join(get_logs_directory(), name))
+        self._json_path = os.path.join(get_logs_directory(), json_name)
+        if self.supportsP4Runtime():
+            self._p4info_path = os.path.join(get_logs_directory(), p4info_name)
 
     def json(self):
         if self._json_path is None:
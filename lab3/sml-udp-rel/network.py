@@ -23,42 +23,332 @@ from lib import config # do not import anything before this
 from p4app import P4Mininet
 from mininet.topo import Topo
 from mininet.cli import CLI
+from lib.daemon import Request
+import numpy as np
+import contextlib
+import json
 import os
+import sys
+import time
 
-NUM_WORKERS = 2 # TODO: Make sure your program can handle larger values
+NUM_WORKERS      = 2    # TODO: Make sure your program can handle larger values
+WORKERS_PER_LEAF = None # Split the workers over leaf switches below a spine, None for a single switch
+POOL_SIZE        = 16   # Aggregation slots in use, at most MAX_SLOTS in p4/main.p4
+DAEMON           = False # Keep the workers running between runs, see StartWorkers()
+
+# Address the workers send their chunks to, shared by all leaf switches
+SWITCH_IP  = "10.0.0.254"
+SWITCH_MAC = "00:00:00:00:02:fe"
+
+# Address the leaf switches send their partial results to
+SPINE_IP  = "10.0.0.253"
+SPINE_MAC = "00:00:00:00:02:fd"
+SPINE     = "s0"
+
+# Switch roles, see p4/main.p4
+SML_ROLE_ROOT = 0
+SML_ROLE_LEAF = 1
+
+# Registers holding the aggregation state, see TheIngress in p4/main.p4
+SML_REGISTERS = ["agg_values", "agg_bitmap", "agg_count", "agg_seq", "agg_result"]
+
+# Configurations swept by `python network.py bench`. CHUNK_SIZE is not swept,
+# it is fixed by the number of lanes in the header of p4/main.p4
+BENCH_WORKERS = [2, 4, 8]
+BENCH_SIZES   = [1024, 16384, 131072] # Elements, rounded up to a multiple of CHUNK_SIZE
+BENCH_WINDOWS = [4, 8, 16]            # Chunks in flight (num_slots of AllReduce in worker.py), at most POOL_SIZE
+BENCH_REPS    = 10
+CHUNK_SIZE    = 32                    # Must match CHUNK_SIZE in p4/main.p4
+
+# Entry counts swept by `python network.py bench-writes`, ethernet_table in
+# p4/main.p4 holds 1024 entries including the ones of RunControlPlane()
+WRITE_BENCH_ENTRIES = [64, 256, 960]
+
+# Simple logic to allocate IP and MAC addresses based on the worker ID
+def getWorkerIP(wid):
+    return "10.0.0.%d" % (wid + 1)
+
+def getWorkerMAC(wid):
+    return "00:00:00:00:01:%02x" % (wid + 1)
+
+def getLeafName(lid):
+    return "s%d" % (lid + 1)
+
+def getLeaves(num_workers=NUM_WORKERS, workers_per_leaf=WORKERS_PER_LEAF):
+    """
+    Group the worker ranks by leaf switch. Worker i of a leaf is on port i,
+    the uplink to the spine follows the last worker. A single leaf is the
+    single-switch star without a spine
+    """
+    per_leaf = workers_per_leaf or num_workers
+    return [range(r, min(r + per_leaf, num_workers)) for r in range(0, num_workers, per_leaf)]
 
 class SMLTopo(Topo):
-    def __init__(self, **opts):
+    def __init__(self, num_workers=NUM_WORKERS, workers_per_leaf=WORKERS_PER_LEAF, **opts):
         Topo.__init__(self, **opts)
-        # TODO: Implement me. Feel free to modify the constructor signature
         # NOTE: Make sure worker names are consistent with RunWorkers() below
+        leaves = getLeaves(num_workers, workers_per_leaf)
+        if len(leaves) > 1:
+            spine = self.addSwitch(SPINE)
+        for lid, ranks in enumerate(leaves):
+            sw = self.addSwitch(getLeafName(lid))
+            for port, i in enumerate(ranks):
+                worker = self.addHost('w%d' % i, ip=getWorkerIP(i), mac=getWorkerMAC(i))
+                self.addLink(worker, sw, port2=port)
+            if len(leaves) > 1:
+                self.addLink(sw, spine, port1=len(ranks), port2=lid)
 
-def RunWorkers(net):
+def ResetSwitchState(net):
+    """
+    Clear the aggregation registers before every run. Workers number their
+    chunks from 0 on every run, also when a daemon serves it (see Run() in
+    worker.py), so a slot holding a higher sequence number from the previous
+    run would ignore them
+    """
+    for sw in net.switches:
+        sw.commands(['register_reset TheIngress.%s' % r for r in SML_REGISTERS], quiet=True)
+
+def RunWorkers(net, num_workers=NUM_WORKERS, args=""):
     """
     Starts the workers and waits for their completion.
     Redirects output to logs/<worker_name>.log (see lib/worker.py, Log())
     This function assumes worker i is named 'w<i>'. Feel free to modify it
-    if your naming scheme is different
+    if your naming scheme is different. The worker count goes to the workers in
+    os.environ['APP_NUM_WORKERS'], see GetNumWorkers() in worker.py
     """
+    ResetSwitchState(net)
+    if getattr(net, 'daemons', 0):
+        return Request(range(net.daemons), args.split())
     worker = lambda rank: "w%i" % rank
     log_file = lambda rank: os.path.join(os.environ['APP_LOGS'], "%s.log" % worker(rank))
-    for i in range(NUM_WORKERS):
-        net.get(worker(i)).sendCmd('python worker.py %d > %s' % (i, log_file(i)))
-    for i in range(NUM_WORKERS):
+    for i in range(num_workers):
+        net.get(worker(i)).sendCmd('APP_NUM_WORKERS=%d python worker.py %d %s > %s' % (num_workers, i, args, log_file(i)))
+    for i in range(num_workers):
         net.get(worker(i)).waitOutput()
 
-def RunControlPlane(net):
+def StartWorkers(net, num_workers=NUM_WORKERS):
+    """
+    Start the workers as daemons (see lib/daemon.py). Until StopWorkers(),
+    RunWorkers() hands every run to them instead of starting new processes
+    """
+    worker = lambda rank: "w%i" % rank
+    log_file = lambda rank: os.path.join(os.environ['APP_LOGS'], "%s.log" % worker(rank))
+    for i in range(num_workers):
+        net.get(worker(i)).cmd('APP_NUM_WORKERS=%d python worker.py %d daemon > %s 2>&1 &' % (num_workers, i, log_file(i)))
+    net.daemons = num_workers
+
+def StopWorkers(net):
+    if getattr(net, 'daemons', 0):
+        Request(range(net.daemons), ["exit"])
+        net.daemons = 0
+
+def RunBenchmark(net, num_workers=NUM_WORKERS, sizes=BENCH_SIZES, windows=BENCH_WINDOWS, reps=BENCH_REPS):
+    """
+    Run <reps> timed all-reduces for every vector size and window and return
+    one row per configuration. The time of an all-reduce is that of the
+    slowest worker, goodput is elements per second at the median time
+    """
+    rows = []
+    for size in sizes:
+        num_elem = -(-size // CHUNK_SIZE) * CHUNK_SIZE
+        for window in windows:
+            assert window <= POOL_SIZE, "the window must fit into the slot pool"
+            RunWorkers(net, num_workers, "bench %d %d %d" % (num_elem, window, reps))
+            results = []
+            for i in range(num_workers):
+                with open(os.path.join(os.environ['APP_LOGS'], "bench-rank-%d.json" % i)) as f:
+                    results.append(json.load(f))
+            times = np.max([r["times"] for r in results], axis=0)
+            p50, p99 = np.percentile(times, [50, 99])
+            rows.append({"workers": num_workers, "elements": num_elem, "window": window, "reps": reps,
+                         "goodput": num_elem / p50, "p50": p50, "p99": p99,
+                         "retransmits": sum(r["retransmits"] for r in results)})
+    return rows
+
+def FormatBenchmark(rows):
+    lines = ["%7s %9s %6s %4s %15s %9s %9s %11s" %
+             ("workers", "elements", "window", "reps", "goodput(el/s)", "p50(ms)", "p99(ms)", "retransmits")]
+    for r in rows:
+        lines.append("%7d %9d %6d %4d %15.0f %9.2f %9.2f %11d" %
+                     (r["workers"], r["elements"], r["window"], r["reps"], r["goodput"],
+                      r["p50"] * 1e3, r["p99"] * 1e3, r["retransmits"]))
+    return "\n".join(lines)
+
+def RunWriteBenchmark(net, sizes=WRITE_BENCH_ENTRIES):
+    """
+    Fill ethernet_table of the first leaf with dummy entries, once with one
+    Write request per entry, once in a write batch and once in a write batch
+    from a prepared entry, and return the rates in entries/s. The entries are
+    removed again after each run
+    """
+    sw = net.get(getLeafName(0))
+    fwd = sw.prepareTableEntry('TheIngress.ethernet_table', ['hdr.eth.dstAddr'],
+                               'TheIngress.l2_forward', ['port'])
+    rows = []
+    for num_entries in sizes:
+        entries = [{'table_name': 'TheIngress.ethernet_table',
+                    'match_fields': {'hdr.eth.dstAddr': '02:00:00:00:%02x:%02x' % (i >> 8, i & 0xff)},
+                    'action_name': 'TheIngress.l2_forward',
+                    'action_params': {'port': 0}} for i in range(num_entries)]
+        row = {"entries": num_entries}
+        for mode in ("single", "batched"):
+            start = time.perf_counter()
+            with sw.writeBatch() if mode == "batched" else contextlib.nullcontext():
+                for entry in entries:
+                    sw.insertTableEntry(entry)
+            row[mode] = num_entries / (time.perf_counter() - start)
+            with sw.writeBatch():
+                for entry in entries:
+                    sw.removeTableEntry(entry)
+        start = time.perf_counter()
+        with sw.writeBatch():
+            for i in range(num_entries):
+                sw.insertPreparedEntry(fwd, [0x020000000000 | i], [0])
+        row["prepared"] = num_entries / (time.perf_counter() - start)
+        with sw.writeBatch():
+            for i in range(num_entries):
+                sw.removePreparedEntry(fwd, [0x020000000000 | i], [0])
+        rows.append(row)
+    return rows
+
+def FormatWriteBenchmark(rows):
+    lines = ["%7s %16s %17s %18s" % ("entries", "single(entry/s)", "batched(entry/s)", "prepared(entry/s)")]
+    for r in rows:
+        lines.append("%7d %16.0f %17.0f %18.0f" % (r["entries"], r["single"], r["batched"], r["prepared"]))
+    return "\n".join(lines)
+
+def ConfigureSwitch(sw, num_workers, first_rank=0, role=SML_ROLE_ROOT, upstream_port=0, upstream_rank=0):
+    """
+    Program the aggregation parameters of a switch (see set_sml_config in p4/main.p4)
+    and its multicast group towards the num_workers downstream ports
+    """
+    sw.insertTableEntry(table_name='TheIngress.sml_config',
+                        default_action=True,
+                        action_name='TheIngress.set_sml_config',
+                        action_params={'num_workers': num_workers, 'pool_size': POOL_SIZE,
+                                       'first_rank': first_rank, 'role': role,
+                                       'upstream_port': upstream_port, 'upstream_rank': upstream_rank})
+    sw.insertTableEntry(table_name='TheIngress.ethernet_table',
+                        match_fields={'hdr.eth.dstAddr': 'ff:ff:ff:ff:ff:ff'},
+                        action_name='TheIngress.multicast',
+                        action_params={'mgid': 1})
+    # Group 1 is used for broadcasts and for results (SML_MGID in p4/main.p4)
+    sw.addMulticastGroup(mgid=1, ports=range(num_workers))
+
+def AddRoute(sw, wid, port):
+    """
+    Plain L2 forwarding towards worker wid, for everything that is not SwitchML,
+    and the port towards wid for the values of rooted operations (Reduce etc.)
+    """
+    sw.insertTableEntry(table_name='TheIngress.ethernet_table',
+                        match_fields={'hdr.eth.dstAddr': getWorkerMAC(wid)},
+                        action_name='TheIngress.l2_forward',
+                        action_params={'port': port})
+    sw.insertTableEntry(table_name='TheIngress.sml_rank_port',
+                        match_fields={'hdr.sml.root': wid},
+                        action_name='TheIngress.set_root_port',
+                        action_params={'port': port})
+
+def AddResultDst(sw, port, mac, ip):
+    """
+    SwitchML packets leaving on port are addressed to mac/ip
+    """
+    sw.insertTableEntry(table_name='TheEgress.sml_result_dst',
+                        match_fields={'standard_metadata.egress_port': port},
+                        action_name='TheEgress.set_worker_dst',
+                        action_params={'mac': mac, 'ip': ip})
+
+def RunControlPlane(net, num_workers=NUM_WORKERS):
     """
     One-time control plane configuration
+
+    With a single leaf the switch aggregates all workers (root role). Otherwise
+    every leaf aggregates its own workers and forwards the partial result to
+    the spine, which aggregates the leaves and sends the result back down
+    """
+    leaves = getLeaves(num_workers)
+    tiered = len(leaves) > 1
+    assert num_workers <= 256, "ranks are 8 bits wide"
+    assert len(leaves) <= 32 and all(len(r) <= 32 for r in leaves), "contribution bitmaps are 32 bits wide"
+
+    # Each switch only gets what changed since the last run, in as few Write
+    # requests as possible, so the control plane can be run again
+    for lid, ranks in enumerate(leaves):
+        sw = net.get(getLeafName(lid))
+        uplink = len(ranks)
+        with sw.reconcile():
+            ConfigureSwitch(sw, len(ranks), ranks.start, SML_ROLE_LEAF if tiered else SML_ROLE_ROOT, uplink, lid)
+            for port, i in enumerate(ranks):
+                AddRoute(sw, i, port)
+                AddResultDst(sw, port, getWorkerMAC(i), getWorkerIP(i))
+                # The switch does not answer ARP, so workers get a static entry for it
+                net.get('w%d' % i).setARP(SWITCH_IP, SWITCH_MAC)
+            if tiered:
+                for i in range(num_workers):
+                    if i not in ranks:
+                        AddRoute(sw, i, uplink)
+                AddResultDst(sw, uplink, SPINE_MAC, SPINE_IP)
+
+    if tiered:
+        spine = net.get(SPINE)
+        with spine.reconcile():
+            ConfigureSwitch(spine, len(leaves))
+            for lid, ranks in enumerate(leaves):
+                for i in ranks:
+                    AddRoute(spine, i, lid)
+                AddResultDst(spine, lid, SWITCH_MAC, SWITCH_IP)
+
+def Benchmark():
+    """
+    Sweep BENCH_WORKERS, on a fresh network each, and write the table of all
+    configurations to logs/bench.txt
+    """
+    rows = []
+    for num_workers in BENCH_WORKERS:
+        net = P4Mininet(program="p4/main.p4", topo=SMLTopo(num_workers))
+        net.start()
+        RunControlPlane(net, num_workers)
+        if DAEMON:
+            StartWorkers(net, num_workers)
+        rows += RunBenchmark(net, num_workers)
+        StopWorkers(net)
+        net.stop()
+    table = FormatBenchmark(rows)
+    with open(os.path.join(os.environ['APP_LOGS'], "bench.txt"), 'w') as f:
+        f.write(table + "\n")
+    print(table)
+
+def WriteBenchmark():
+    """
+    Run RunWriteBenchmark() on a fresh network and write the table to
+    logs/bench-writes.txt
     """
-    # TODO: Implement me (if needed)
-    pass
-
-topo = None # TODO: Create an SMLTopo instance
-net = P4Mininet(program="p4/main.p4", topo=topo)
-net.run_control_plane = lambda: RunControlPlane(net)
-net.run_workers = lambda: RunWorkers(net)
-net.start()
-net.run_control_plane()
-CLI(net)
-net.stop()
\ No newline at end of file
+    net = P4Mininet(program="p4/main.p4", topo=SMLTopo())
+    net.start()
+    RunControlPlane(net)
+    table = FormatWriteBenchmark(RunWriteBenchmark(net))
+    net.stop()
+    with open(os.path.join(os.environ['APP_LOGS'], "bench-writes.txt"), 'w') as f:
+        f.write(table + "\n")
+    print(table)
+
+if sys.argv[1:2] == ["bench"]:
+    Benchmark()
+elif sys.argv[1:2] == ["bench-writes"]:
+    WriteBenchmark()
+else:
+    topo = SMLTopo()
+    net = P4Mininet(program="p4/main.p4", topo=topo)
+    net.run_control_plane = lambda: RunControlPlane(net)
+    net.run_workers = lambda: RunWorkers(net)
+    net.start_workers = lambda: StartWorkers(net)
+    net.stop_workers = lambda: StopWorkers(net)
+    net.run_benchmark = lambda: print(FormatBenchmark(RunBenchmark(net)))
+    net.run_write_benchmark = lambda: print(FormatWriteBenchmark(RunWriteBenchmark(net)))
+    net.start()
+    net.run_control_plane()
+    if DAEMON:
+        StartWorkers(net)
+    CLI(net)
+    StopWorkers(net)
+    net.stop()
\ No newline at end of file
@@ -19,22 +19,126 @@
  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
  """
 
-from lib.gen import GenInts, GenMultipleOfInRange
-from lib.test import CreateTestData, RunIntTest
+from lib.gen import GenInts, GenFloats, GenIntArray, GenMultipleOfInRange
+from lib.test import CreateTestData, RunIntTest, RunFloatTest
+from lib.quant import AllReduceFloat
+from lib.trace import GetTracer, SEND, RECV, RETRANSMIT
+from lib.daemon import Serve
 from lib.worker import *
-from scapy.all import Packet
+from lib.comm import send, receive, transport_send, transport_receive
+import asyncio
 import socket
+import struct
+import time
+import json
+import os
+import sys
 
 NUM_ITER   = 1     # TODO: Make sure your program can handle larger values
-CHUNK_SIZE = None  # TODO: Define me
+FLOAT_ITER = 1     # Float iterations, quantized per chunk (see lib/quant.py)
+COLL_ITER  = 1     # Iterations of Reduce, ReduceScatter, AllGather and Broadcast
+CHUNK_SIZE = 32    # Elements per packet, must match CHUNK_SIZE in p4/main.p4
+NUM_SLOTS  = 16    # Chunks in flight, must not exceed POOL_SIZE in network.py
+TIMEOUT    = 0.5   # Seconds before an unacknowledged chunk is retransmitted
+NUM_JOBS   = 4     # Concurrent AllReduce operations of AsyncAllReduceClient
+ASYNC      = False # Run the iterations in main() concurrently on AsyncAllReduceClient
 
-class SwitchML(Packet):
-    name = "SwitchMLPacket"
-    fields_desc = [
-        # TODO: Implement me
-    ]
+SML_PORT  = 9999
+SWITCH_IP = "10.0.0.254"
 
-def AllReduce(soc, rank, data, result):
+# Operations, see SML_OP_* in p4/main.p4. Lanes are unsigned 32-bit integers
+OP_SUM     = 0
+OP_MAX     = 1
+OP_MIN     = 2
+OP_ROOTED  = 0x80 # Only the root worker of a chunk gets its values
+OP_NO_VALS = 0x40 # No values follow the header: an ack of a rooted operation, or an
+                  # empty contribution, which the switch counts as zeros
+
+class SwitchML:
+    """
+    SwitchML header followed by CHUNK_SIZE values, see p4/main.p4
+
+    Packed and parsed with struct, so the hot path does not need scapy.
+    Show() prints the scapy dissection for debugging
+    """
+    __slots__ = ("rank", "ver", "op", "root", "job", "slot", "seq", "vals")
+    HEADER = struct.Struct("!BBBBHHI")
+    VALS   = struct.Struct("!%dI" % CHUNK_SIZE)
+
+    def __init__(self, rank=0, ver=0, op=0, root=0, job=0, slot=0, seq=0, vals=()):
+        self.rank, self.ver, self.op, self.root, self.job, self.slot, self.seq = rank, ver, op, root, job, slot, seq
+        self.vals = vals
+
+    def __bytes__(self):
+        hdr = self.HEADER.pack(self.rank, self.ver, self.op, self.root, self.job, self.slot, self.seq)
+        return hdr if self.vals is None else hdr + self.VALS.pack(*self.vals)
+
+    @classmethod
+    def parse(cls, buf, offset=0):
+        """
+        vals is None for an ack without values (OP_NO_VALS)
+        """
+        pkt = cls(*cls.HEADER.unpack_from(buf, offset))
+        if pkt.op & OP_NO_VALS:
+            pkt.vals = None
+        else:
+            pkt.vals = list(cls.VALS.unpack_from(buf, offset + cls.HEADER.size))
+        return pkt
+
+    def Show(self):
+        ScapySwitchML()(bytes(self)).show()
+
+def ScapySwitchML():
+    """
+    The header as a scapy layer. scapy is slow to import, so this happens
+    on first use only
+    """
+    if ScapySwitchML.cls is None:
+        from scapy.all import Packet, ByteField, ShortField, IntField, FieldListField
+        class SwitchMLPacket(Packet):
+            name = "SwitchMLPacket"
+            fields_desc = [
+                ByteField("rank", 0),
+                ByteField("ver", 0),
+                ByteField("op", 0),
+                ByteField("root", 0),
+                ShortField("job", 0),
+                ShortField("slot", 0),
+                IntField("seq", 0),
+                FieldListField("vals", [], IntField("", 0), count_from=lambda pkt: CHUNK_SIZE),
+            ]
+        ScapySwitchML.cls = SwitchMLPacket
+    return ScapySwitchML.cls
+ScapySwitchML.cls = None
+
+def _is_acked(acked, chunk):
+    return acked[chunk >> 3] & (1 << (chunk & 7))
+
+def _set_acked(acked, chunk):
+    acked[chunk >> 3] |= 1 << (chunk & 7)
+
+def _chunk_vals(data, chunk):
+    return data[chunk * CHUNK_SIZE:(chunk + 1) * CHUNK_SIZE]
+
+def _chunk_packet(rank, job, first_slot, num_slots, seq, vals, op=OP_SUM, root=0):
+    """
+    Build the packet carrying the chunk values `vals` with sequence number
+    `seq`, using slots [first_slot, first_slot + num_slots). Without values
+    (None), it is an empty contribution
+    """
+    if vals is None:
+        op |= OP_NO_VALS
+    return SwitchML(rank=rank, ver=(seq // num_slots) % 2, op=op, root=root, job=job,
+                    slot=first_slot + seq % num_slots, seq=seq, vals=vals)
+
+# Sequence number of the next chunk. It keeps growing across the AllReduce calls of a run,
+# so the switch can tell a delayed packet from a new use of a slot
+_next_seq = 0
+
+# Chunks sent again after TIMEOUT, over the lifetime of the process
+_retransmits = 0
+
+def AllReduce(soc, rank, data, result, op=OP_SUM, num_slots=NUM_SLOTS):
     """
     Perform reliable in-network all-reduce over UDP
 
@@ -42,35 +146,410 @@ def AllReduce(soc, rank, data, result):
     :param int   rank: the worker's rank
     :param [int] data: the input vector for this worker
     :param [int]  res: the output vector
+    :param int     op: OP_SUM, OP_MAX or OP_MIN
+    :param int num_slots: chunks in flight, at most POOL_SIZE in network.py
 
     This function is blocking, i.e. only returns with a result or error
+
+    Chunk i is aggregated in slot (seq % num_slots), alternating between the two
+    versions of the slot. A worker only sends the next chunk of a slot once it
+    has the result of the previous one. Acknowledged chunks are tracked in a
+    bitmap and only chunks without a result are retransmitted. The switch keeps
+    the last result of every slot version and answers a retransmitted
+    contribution with it directly.
     """
+    _Collective(soc, rank, len(data) // CHUNK_SIZE, lambda chunk: _chunk_vals(data, chunk),
+                result, op, num_slots=num_slots)
 
-    # TODO: Implement me
+def _Collective(soc, rank, num_chunks, values, result, op, roots=None, first=0, num_slots=NUM_SLOTS):
+    """
+    The protocol of AllReduce(), for <num_chunks> chunks where this worker
+    contributes values(c) to chunk c, or nothing if that is None. With roots,
+    chunk c only goes back to the worker roots(c) and the others get acks.
+    The values of chunk c go to result[(c - first) * CHUNK_SIZE:], if that is
+    within result
+    """
+    global _next_seq, _retransmits
     # NOTE: Do not send/recv directly to/from the socket.
     #       Instead, please use the functions send() and receive() from lib/comm.py
     #       We will use modified versions of these functions to test your program
     #
     #       You may use the functions unreliable_send() and unreliable_receive()
     #       to test how your solution handles dropped/delayed packets
-    pass
+    base = _next_seq
+    _next_seq += num_chunks
+    acked = bytearray((num_chunks + 7) // 8)
+    in_flight = {} # chunk -> time of its last transmission
+    tracer = GetTracer()
 
-def main():
-    rank = GetRankOrExit()
+    def send_chunk(chunk, event=SEND):
+        seq = base + chunk
+        if roots is None:
+            pkt = _chunk_packet(rank, 0, 0, num_slots, seq, values(chunk), op)
+        else:
+            pkt = _chunk_packet(rank, 0, 0, num_slots, seq, values(chunk), op | OP_ROOTED, roots(chunk))
+        send(soc, bytes(pkt), (SWITCH_IP, SML_PORT))
+        in_flight[chunk] = time.time()
+        if tracer:
+            tracer.Record(event, seq, seq % num_slots)
 
-    s = None # TODO: Create a UDP socket. 
-    # NOTE: This socket will be used for all AllReduce calls.
-    #       Feel free to go with a different design (e.g. multiple sockets)
-    #       if you want to, but make sure the loop below still works
+    for chunk in range(min(num_slots, num_chunks)):
+        send_chunk(chunk)
 
-    Log("Started...")
+    done = 0
+    while done < num_chunks:
+        try:
+            pkt = SwitchML.parse(receive(soc, 2048)[0])
+            chunk = pkt.seq - base
+            if 0 <= chunk < num_chunks and not _is_acked(acked, chunk):
+                _set_acked(acked, chunk)
+                done += 1
+                del in_flight[chunk]
+                if tracer:
+                    tracer.Record(RECV, pkt.seq, pkt.seq % num_slots)
+                pos = (chunk - first) * CHUNK_SIZE
+                if pkt.vals is not None and 0 <= pos < len(result):
+                    result[pos:pos + CHUNK_SIZE] = pkt.vals
+                if chunk + num_slots < num_chunks:
+                    send_chunk(chunk + num_slots)
+        except socket.timeout:
+            pass
+        now = time.time()
+        for chunk, sent in list(in_flight.items()):
+            if now - sent >= TIMEOUT:
+                GetLogger().Debug("retransmit", chunk=chunk, seq=base + chunk)
+                send_chunk(chunk, RETRANSMIT)
+                _retransmits += 1
+
+def Reduce(soc, rank, data, result, root=0, op=OP_SUM):
+    """
+    Like AllReduce(), but only the worker <root> gets the result. The others
+    only get acks and their <result> is left as is
+    """
+    _Collective(soc, rank, len(data) // CHUNK_SIZE, lambda chunk: _chunk_vals(data, chunk),
+                result, op, lambda chunk: root)
+
+def ReduceScatter(soc, rank, num_workers, data, result, op=OP_SUM):
+    """
+    Reduce <data>, which is split into <num_workers> shards of equal size,
+    and leave shard <rank> of the result in <result>
+
+    The shard size must be a multiple of CHUNK_SIZE. Every worker gets the
+    values of its own shard only, and acks without values for the rest
+    """
+    shard = len(data) // num_workers // CHUNK_SIZE
+    assert shard * num_workers * CHUNK_SIZE == len(data), "shards must be whole chunks"
+    _Collective(soc, rank, len(data) // CHUNK_SIZE, lambda chunk: _chunk_vals(data, chunk),
+                result, op, lambda chunk: chunk // shard, rank * shard)
+
+def AllGather(soc, rank, num_workers, data, result):
+    """
+    Concatenate <data> of all workers, in order of rank, into <result>
+
+    The shard layout of ReduceScatter() in reverse: a worker contributes the
+    values of its own shard only and empty contributions (OP_NO_VALS) for the
+    others, which the switch counts as zeros. Every worker gets all values.
+    len(data) must be a multiple of CHUNK_SIZE
+    """
+    shard = len(data) // CHUNK_SIZE
+    assert shard * CHUNK_SIZE == len(data), "shards must be whole chunks"
+    own = rank * shard
+    values = lambda chunk: _chunk_vals(data, chunk - own) if own <= chunk < own + shard else None
+    _Collective(soc, rank, shard * num_workers, values, result, OP_SUM)
+
+def Broadcast(soc, rank, data, result, root=0):
+    """
+    Copy <data> of the worker <root> into <result> of every worker
+
+    Only the root sends values, the others send empty contributions of
+    len(result) elements, so their <data> is not used
+    """
+    if rank == root:
+        values = lambda chunk: _chunk_vals(data, chunk)
+    else:
+        values = lambda chunk: None
+    _Collective(soc, rank, len(result) // CHUNK_SIZE, values, result, OP_SUM)
+
+class _AllReduceJob:
+    """
+    State of one AllReduce operation of AsyncAllReduceClient. Same protocol as
+    AllReduce(), restricted to the slots of the job's partition
+    """
+    def __init__(self, client, job, partition, base, data, result, op=OP_SUM):
+        self.client = client
+        self.job = job
+        self.op = op
+        self.first_slot = partition * client.slots_per_job
+        self.base = base
+        self.data = data
+        self.result = result
+        self.num_chunks = len(data) // CHUNK_SIZE
+        self.acked = bytearray((self.num_chunks + 7) // 8)
+        self.done = 0
+        self.in_flight = {} # chunk -> time of its last transmission
+        self.future = client.loop.create_future()
+        self.timer = None
+        self.tracer = GetTracer()
+
+    def start(self):
+        if self.num_chunks == 0:
+            return self.future.set_result(self.result)
+        for chunk in range(min(self.client.slots_per_job, self.num_chunks)):
+            self.send_chunk(chunk)
+        self.timer = self.client.loop.call_later(TIMEOUT, self.on_timeout)
+
+    def send_chunk(self, chunk, event=SEND):
+        pkt = _chunk_packet(self.client.rank, self.job, self.first_slot, self.client.slots_per_job,
+                            self.base + chunk, _chunk_vals(self.data, chunk), self.op)
+        transport_send(self.client.transport, bytes(pkt), (SWITCH_IP, SML_PORT))
+        self.in_flight[chunk] = time.time()
+        if self.tracer:
+            self.tracer.Record(event, pkt.seq, pkt.slot)
+
+    def on_result(self, pkt):
+        chunk = pkt.seq - self.base
+        if not 0 <= chunk < self.num_chunks or _is_acked(self.acked, chunk):
+            return
+        _set_acked(self.acked, chunk)
+        self.done += 1
+        del self.in_flight[chunk]
+        if self.tracer:
+            self.tracer.Record(RECV, pkt.seq, pkt.slot)
+        self.result[chunk * CHUNK_SIZE:(chunk + 1) * CHUNK_SIZE] = pkt.vals
+        if chunk + self.client.slots_per_job < self.num_chunks:
+            self.send_chunk(chunk + self.client.slots_per_job)
+        if self.done == self.num_chunks:
+            self.timer.cancel()
+            self.future.set_result(self.result)
+
+    def on_timeout(self):
+        global _retransmits
+        now = time.time()
+        for chunk, sent in list(self.in_flight.items()):
+            if now - sent >= TIMEOUT:
+                GetLogger().Debug("retransmit", job=self.job, chunk=chunk, seq=self.base + chunk)
+                self.send_chunk(chunk, RETRANSMIT)
+                _retransmits += 1
+        self.timer = self.client.loop.call_later(TIMEOUT, self.on_timeout)
+
+class AsyncAllReduceClient(asyncio.DatagramProtocol):
+    """
+    Non-blocking in-network all-reduce on a single UDP socket
+
+    Every call to AllReduce() returns a future and the operations run
+    concurrently, so communication for one tensor can overlap with computing
+    the next. Operations are numbered in the order they are started and the
+    number is carried in the job field of the SwitchML header. Workers must
+    start their operations in the same order.
+
+    The slot pool is split into NUM_JOBS partitions and job j uses partition
+    j % NUM_JOBS, an operation whose partition is still busy starts once its
+    predecessor completes. Do not mix with AllReduce() within one run, both
+    number chunks independently.
+    """
+    def __init__(self, rank):
+        self.rank = rank
+        self.loop = asyncio.get_running_loop()
+        self.transport = None
+        self.slots_per_job = NUM_SLOTS // NUM_JOBS
+        self.next_job = 0
+        self.next_seq = [0] * NUM_JOBS # per partition
+        self.tails = [None] * NUM_JOBS # last job started on each partition
+        self.jobs = {}
+
+    @classmethod
+    async def create(cls, rank, local_addr=("0.0.0.0", SML_PORT)):
+        """
+        Create a client bound to `local_addr`
+        """
+        loop = asyncio.get_running_loop()
+        _, client = await loop.create_datagram_endpoint(lambda: cls(rank), local_addr=local_addr)
+        return client
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        # NOTE: As with send() and receive() in AllReduce(), all traffic goes
+        #       through transport_send() and transport_receive() of lib/comm.py
+        data = transport_receive(data, addr)
+        if data is None:
+            return
+        pkt = SwitchML.parse(data)
+        job = self.jobs.get(pkt.job)
+        if job is not None:
+            job.on_result(pkt)
+
+    def AllReduce(self, data, result, op=OP_SUM):
+        """
+        Start an all-reduce of `data` into `result`
+
+        :param [int] data: the input vector for this worker
+        :param [int]  res: the output vector
+        :param int     op: OP_SUM, OP_MAX or OP_MIN
+
+        Returns a future that resolves to `result` once it holds the result
+        """
+        assert self.slots_per_job > 0, "NUM_SLOTS must be at least NUM_JOBS"
+        job_id = self.next_job & 0xffff
+        partition = self.next_job % NUM_JOBS
+        self.next_job += 1
+        job = _AllReduceJob(self, job_id, partition, self.next_seq[partition], data, result, op)
+        self.next_seq[partition] += job.num_chunks
+        self.jobs[job_id] = job
+        job.future.add_done_callback(lambda _: self.jobs.pop(job_id, None))
+
+        prev = self.tails[partition]
+        self.tails[partition] = job
+        if prev is None or prev.future.done():
+            job.start()
+        else:
+            prev.future.add_done_callback(lambda _: job.start())
+        return job.future
+
+    def close(self):
+        self.transport.close()
+
+async def main_async(rank, tests):
+    """
+    Run all iterations concurrently and test them as they complete. The tests
+    run in the default executor, so they do not hold up the event loop
+    """
+    loop = asyncio.get_running_loop()
+    client = await AsyncAllReduceClient.create(rank)
+    futures = [client.AllReduce(data_out, data_in) for _, data_out, data_in in tests]
+    for (testid, _, _), future in zip(tests, futures):
+        await loop.run_in_executor(None, RunIntTest, testid, rank, await future, True)
+    client.close()
+
+def RunBenchmark(soc, rank, num_elem, window, reps):
+    """
+    Time <reps> all-reduces of <num_elem> elements with <window> chunks in
+    flight and write the times and the retransmission count to
+    APP_LOGS/bench-rank-<rank>.json (see RunBenchmark in network.py)
+
+    An untimed all-reduce runs first, it waits for the slowest worker to start
+    """
+    data = GenIntArray(num_elem, rank).tolist()
+    result = [0] * num_elem
+    AllReduce(soc, rank, data, result, num_slots=window)
+    retransmits = _retransmits
+    times = []
+    for _ in range(reps):
+        start = time.perf_counter()
+        AllReduce(soc, rank, data, result, num_slots=window)
+        times.append(time.perf_counter() - start)
+    with open(os.path.join(os.environ['APP_LOGS'], "bench-rank-%d.json" % rank), 'w') as f:
+        json.dump({"times": times, "retransmits": _retransmits - retransmits}, f)
+
+def GetNumWorkers():
+    """
+    The number of workers, from os.environ['APP_NUM_WORKERS'] as set by
+    RunWorkers() in network.py, or None when started by hand
+    """
+    n = os.environ.get('APP_NUM_WORKERS')
+    return int(n) if n else None
+
+def RunCollectiveTests(soc, rank, num_workers, i):
+    """
+    Test Reduce, ReduceScatter, AllGather and Broadcast with the sum-based
+    checks of lib/test.py: each worker writes the input whose sum over all
+    workers is the expected result of the operation
+    """
+    shard = GenMultipleOfInRange(CHUNK_SIZE, 512, CHUNK_SIZE, seed=4343 + i)
+    num_elem = shard * num_workers
+    data = GenInts(num_elem, rank=rank, seed=4343 + i)
+
+    root = num_workers - 1
+    result = GenInts(num_elem, 0)
+    CreateTestData("udp-rel-reduce-iter-%d" % i, rank, data)
+    Reduce(soc, rank, data, result, root)
+    if rank == root:
+        RunIntTest("udp-rel-reduce-iter-%d" % i, rank, result, True)
+
+    # One test per shard, holding that shard of every worker
+    for r in range(num_workers):
+        CreateTestData("udp-rel-reduce-scatter-iter-%d-shard-%d" % (i, r), rank, data[r * shard:(r + 1) * shard])
+    result = GenInts(shard, 0)
+    ReduceScatter(soc, rank, num_workers, data, result)
+    RunIntTest("udp-rel-reduce-scatter-iter-%d-shard-%d" % (i, rank), rank, result, True)
+
+    # The concatenation is the sum of the inputs placed in their blocks
+    padded = GenInts(num_elem, 0)
+    padded[rank * shard:(rank + 1) * shard] = data[:shard]
+    CreateTestData("udp-rel-allgather-iter-%d" % i, rank, padded)
+    result = GenInts(num_elem, 0)
+    AllGather(soc, rank, num_workers, data[:shard], result)
+    RunIntTest("udp-rel-allgather-iter-%d" % i, rank, result, True)
+
+    CreateTestData("udp-rel-broadcast-iter-%d" % i, rank, data if rank == root else GenInts(num_elem, 0))
+    result = GenInts(num_elem, 0)
+    Broadcast(soc, rank, data, result, root)
+    RunIntTest("udp-rel-broadcast-iter-%d" % i, rank, result, True)
+
+def RunTests(soc, rank):
     for i in range(NUM_ITER):
         num_elem = GenMultipleOfInRange(2, 2048, 2 * CHUNK_SIZE) # You may want to 'fix' num_elem for debugging
-        data_out = GenInts(num_elem)
+        data_out = GenInts(num_elem, rank=rank, seed=i)
         data_in = GenInts(num_elem, 0)
         CreateTestData("udp-rel-iter-%d" % i, rank, data_out)
-        AllReduce(s, rank, data_out, data_in)
+        AllReduce(soc, rank, data_out, data_in)
         RunIntTest("udp-rel-iter-%d" % i, rank, data_in, True)
+    for i in range(FLOAT_ITER):
+        num_elem = GenMultipleOfInRange(2, 2048, 2 * CHUNK_SIZE, seed=4242 + i)
+        data_out = GenFloats(num_elem, rank=rank, seed=4242 + i)
+        data_in = GenFloats(num_elem, 0)
+        CreateTestData("udp-rel-float-iter-%d" % i, rank, data_out)
+        AllReduceFloat(lambda d, r: AllReduce(soc, rank, d, r), data_out, data_in, CHUNK_SIZE)
+        RunFloatTest("udp-rel-float-iter-%d" % i, rank, data_in, std_out=True)
+    num_workers = GetNumWorkers()
+    if num_workers is None:
+        return Log("APP_NUM_WORKERS is not set, skipping the tests of the other collectives")
+    for i in range(COLL_ITER):
+        RunCollectiveTests(soc, rank, num_workers, i)
+
+def Run(soc, rank, args):
+    """
+    Run the tests, or the benchmark for args ["bench", <num_elem>, <window>, <reps>]
+
+    Every run numbers its chunks from 0, like a fresh process. A daemon serves
+    several runs and the switch registers are reset in between (see
+    ResetSwitchState in network.py), so sequence numbers of a previous run
+    would no longer match the slots
+    """
+    global _next_seq
+    _next_seq = 0
+    if args[:1] == ["bench"]:
+        RunBenchmark(soc, rank, *map(int, args[1:4]))
+    else:
+        RunTests(soc, rank)
+
+def main():
+    rank = GetRankOrExit()
+
+    Log("Started...")
+    if ASYNC:
+        tests = []
+        for i in range(NUM_ITER):
+            num_elem = GenMultipleOfInRange(2, 2048, 2 * CHUNK_SIZE, seed=42 + i)
+            data_out = GenInts(num_elem, rank=rank, seed=42 + i)
+            CreateTestData("udp-rel-async-iter-%d" % i, rank, data_out)
+            tests.append(("udp-rel-async-iter-%d" % i, data_out, GenInts(num_elem, 0)))
+        asyncio.run(main_async(rank, tests))
+        return Log("Done")
+
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("", SML_PORT))
+    s.settimeout(TIMEOUT)
+    # NOTE: This socket will be used for all AllReduce calls.
+    #       Feel free to go with a different design (e.g. multiple sockets)
+    #       if you want to, but make sure the loops in RunTests() still work
+
+    # python worker.py <rank> [daemon | bench <num_elem> <window> <reps>]
+    if sys.argv[2:3] == ["daemon"]:
+        Serve(rank, lambda args: Run(s, rank, args))
+    else:
+        Run(s, rank, sys.argv[2:])
     Log("Done")
 
 if __name__ == '__main__':
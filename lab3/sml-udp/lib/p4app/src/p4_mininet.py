@@ -21,22 +21,58 @@ from sys import exit
 import os
 import tempfile
 import socket
-from time import sleep
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
+import time
 
 import grpc
+from p4.v1 import p4runtime_pb2
 import p4runtime_lib.bmv2
 import p4runtime_lib.helper
 from p4runtime_lib.error_utils import printGrpcError
 
-from netstat import check_listening_on_port
+from netstat import check_listening_on_port, wait_for_port
 
 from p4app_util import get_logs_directory
 
 SWITCH_START_TIMEOUT = 10 # seconds
+SWITCH_START_THREADS = 16 # switches brought up at the same time by batchStartup()
 
 LOGS_DIR = get_logs_directory()
 
+# Fraction of the P4Runtime requests dumped to <switch>-p4runtime-requests.txt
+# in LOGS_DIR, set by os.environ['APP_P4RUNTIME_LOG']. 0 turns the dump off
+P4RUNTIME_LOG_RATE = float(os.environ.get('APP_P4RUNTIME_LOG', '1'))
+
+def processAlive(pid):
+    return os.path.exists(os.path.join("/proc", str(pid)))
+
+def tableEntryKey(table_entry):
+    """
+    What identifies an entry within the switch: its table, priority and match,
+    or just the table for the default entry. Values are compared without
+    leading zero bytes, as the switch may return them shortened
+    """
+    if table_entry.is_default_action:
+        return (table_entry.table_id,)
+    match = []
+    for m in table_entry.match:
+        kind = m.WhichOneof('field_match_type')
+        values = [v.lstrip(b'\0') if isinstance(v, bytes) else v for _, v in getattr(m, kind).ListFields()]
+        match.append((m.field_id, kind) + tuple(values))
+    return (table_entry.table_id, table_entry.priority, tuple(sorted(match)))
+
+def tableEntryAction(table_entry):
+    "What an entry does, comparable like tableEntryKey"
+    if table_entry.action.WhichOneof('type') != 'action':
+        return table_entry.action.SerializeToString(deterministic=True)
+    action = table_entry.action.action
+    return (action.action_id, tuple(sorted((p.param_id, p.value.lstrip(b'\0')) for p in action.params)))
+
+def multicastGroupReplicas(group):
+    return tuple(sorted((r.egress_port, r.instance) for r in group.replicas))
+
 def tableEntryToString(flow):
     if 'match' in flow:
         match_str = ['%s=%s' % (match_name, str(flow['match'][match_name])) for match_name in
@@ -158,12 +194,7 @@ class P4Switch(Switch):
         server has been started. If the Thrift server is ready, we assume that
         the switch was started successfully. This is only reliable if the Thrift
         server is started at the end of the init process"""
-        while True:
-            if not os.path.exists(os.path.join("/proc", str(pid))):
-                return False
-            if check_listening_on_port(self.thrift_port):
-                return True
-            sleep(0.5)
+        return wait_for_port(self.thrift_port, SWITCH_START_TIMEOUT, lambda: processAlive(pid))
 
     def start(self, controllers):
         "Start up a new P4 switch"
@@ -231,6 +262,7 @@ class P4RuntimeSwitch(P4Switch):
                  enable_debugger = False,
                  cli_path = None,
                  log_file = None,
+                 batch = False,
                  **kwargs):
         Switch.__init__(self, name, **kwargs)
         assert (sw_path)
@@ -291,6 +323,14 @@ class P4RuntimeSwitch(P4Switch):
         if not self.program.supportsP4Runtime():
             self.start_controller = False
         self.sw_conn = None
+        self.write_batch = None
+        # Local copy of what was written to the switch, see reconcile()
+        self.table_state = {}   # tableEntryKey() -> TableEntry
+        self.group_state = {}   # multicast group id -> multicastGroupReplicas(), None if unknown
+        self.desired_keys = None
+        # With batch, start() only launches the switch and batchStartup() waits for it
+        self.batch = batch
+        self.pid = None
         if log_file is not None:
             self.log_file = log_file
         else:
@@ -304,15 +344,31 @@ class P4RuntimeSwitch(P4Switch):
         self.nanomsg = "ipc:///tmp/bm-{}-log.ipc".format(self.device_id)
 
 
+    def readyPort(self):
+        "The port the switch listens on once it is up"
+        return self.grpc_port if self.enable_grpc else self.thrift_port
+
     def check_switch_started(self, pid):
-        for _ in range(SWITCH_START_TIMEOUT * 2):
-            if not os.path.exists(os.path.join("/proc", str(pid))):
-                return False
-            if self.enable_grpc and check_listening_on_port(self.grpc_port):
-                return True
-            elif self.thrift_port and check_listening_on_port(self.thrift_port):
-                return True
-            sleep(0.5)
+        return wait_for_port(self.readyPort(), SWITCH_START_TIMEOUT, lambda: processAlive(pid))
+
+    @classmethod
+    def batchStartup(cls, switches):
+        """
+        Called by Mininet.start() once start() launched all switches. Waits for
+        the ones started with batch and pushes their pipelines concurrently,
+        each as soon as it is up, and reports how long each one took
+        """
+        switches = [s for s in switches if s.batch]
+        if not switches:
+            return switches
+        start = time.monotonic()
+        with ThreadPoolExecutor(min(len(switches), SWITCH_START_THREADS)) as pool:
+            # result() raises the SystemExit of a switch that did not start
+            for future in [pool.submit(s.finishStart) for s in switches]:
+                future.result()
+        info("Started %d P4 switches in %.2f s (%s)\n" % (len(switches), time.monotonic() - start,
+             ", ".join("%s %.2f s" % (s.name, s.bringup_time) for s in switches)))
+        return switches
 
     def start(self, controllers):
         info("Starting P4 switch {}.\n".format(self.name))
@@ -342,22 +398,28 @@ class P4RuntimeSwitch(P4Switch):
         info(cmd + "\n")
 
 
-        pid = None
+        self.launch_time = time.monotonic()
         with tempfile.NamedTemporaryFile() as f:
             self.cmd(cmd + ' >' + self.log_file + ' 2>&1 & echo $! >> ' + f.name)
-            pid = int(f.read())
-        debug("P4 switch {} PID is {}.\n".format(self.name, pid))
-        if not self.check_switch_started(pid):
+            self.pid = int(f.read())
+        debug("P4 switch {} PID is {}.\n".format(self.name, self.pid))
+        if not self.batch:
+            self.finishStart()
+
+    def finishStart(self):
+        "Waits for the switch launched by start() and connects to it"
+        if not self.check_switch_started(self.pid):
             error("P4 switch {} did not start correctly.\n".format(self.name))
             exit(1)
-        info("P4 switch {} has been started.\n".format(self.name))
+        info("P4 switch {} has been started after {:.2f} s.\n".format(self.name, time.monotonic() - self.launch_time))
 
         if self.start_controller:
             self.sw_conn = p4runtime_lib.bmv2.Bmv2SwitchConnection(
                     name=self.name,
                     address='127.0.0.1:' + str(self.grpc_port),
                     device_id=self.device_id,
-                    proto_dump_file=os.path.join(LOGS_DIR, '{}-p4runtime-requests.txt'.format(self.name)))
+                    proto_dump_file=os.path.join(LOGS_DIR, '{}-p4runtime-requests.txt'.format(self.name)),
+                    proto_dump_rate=P4RUNTIME_LOG_RATE)
                     # proto_dump_file='/tmp/p4app-logs/' + self.name + '-p4runtime-requests.txt')
 
             try:
@@ -368,23 +430,26 @@ class P4RuntimeSwitch(P4Switch):
             if self.p4info_path:
                 self.loadP4Info()
             self.loadJSON()
+        self.bringup_time = time.monotonic() - self.launch_time
 
     def stop(self):
         if self.sw_conn: self.sw_conn.shutdown()
         P4Switch.stop(self)
 
-    def commands(self, cmd_list):
+    def commands(self, cmd_list, quiet=False):
+        "Runs cmd_list in the switch CLI. With quiet, the commands and their output go to the debug log instead of stdout"
         if not self.thrift_port:
             raise Exception("Switch %s doesn't use Thrift, so there's no CLI support" % self.name)
-        print('\n'.join(cmd_list))
-        p = subprocess.Popen([self.cli_path, '--thrift-port', str(self.thrift_port)], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        show = (lambda text: debug(text + '\n')) if quiet else print
+        show('\n'.join(cmd_list))
+        p = subprocess.Popen([self.cli_path, '--thrift-port', str(self.thrift_port)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
         stdout, nostderr = p.communicate(input='\n'.join(cmd_list) + '\nEOF\n')
-        print(stdout)
+        show(stdout)
         raw_results = stdout.split('RuntimeCmd:')[1:len(cmd_list)+1]
         return raw_results
 
-    def command(self, cmd):
-        return self.commands([cmd])[0]
+    def command(self, cmd, quiet=False):
+        return self.commands([cmd], quiet)[0]
 
     def loadP4Info(self):
         self.p4info_helper = p4runtime_lib.helper.P4InfoHelper(self.p4info_path)
@@ -393,6 +458,9 @@ class P4RuntimeSwitch(P4Switch):
         try:
             self.sw_conn.SetForwardingPipelineConfig(p4info=self.p4info_helper.p4info,
                     bmv2_json_file_path=self.json_path)
+            # A new pipeline starts out with empty tables
+            self.table_state = {}
+            self.group_state = {}
         except grpc.RpcError as e:
             printGrpcError(e)
 
@@ -421,9 +489,121 @@ class P4RuntimeSwitch(P4Switch):
 
         if 'table_entries' in sw_conf:
             info("Inserting %d table entries..." % len(sw_conf['table_entries']))
-            for entry in sw_conf['table_entries']:
-                info(tableEntryToString(entry))
-                self.insertTableEntry(entry)
+            with self.writeBatch():
+                for entry in sw_conf['table_entries']:
+                    info(tableEntryToString(entry))
+                    self.insertTableEntry(entry)
+
+    @contextmanager
+    def writeBatch(self):
+        """
+        Buffers the table entry and multicast group writes made inside the
+        block and sends them in order, packed into as few Write RPCs as
+        possible, when the block exits. Nested blocks join the outer batch
+        and nothing is written if the block raises. The local copy of the
+        switch state is updated as writes are queued, so later writes of
+        the block see the earlier ones
+        """
+        if self.write_batch is not None:
+            yield
+            return
+        self.write_batch = []
+        saved = (dict(self.table_state), None if self.group_state is None else dict(self.group_state))
+        try:
+            yield
+            updates = self.write_batch
+        except BaseException:
+            self.table_state, self.group_state = saved
+            raise
+        finally:
+            self.write_batch = None
+        if not updates:
+            return
+        try:
+            self.sw_conn.WriteUpdates(updates)
+        except grpc.RpcError as e:
+            printGrpcError(e)
+            # Some of the updates may have been applied
+            self.syncTableState()
+
+    @contextmanager
+    def reconcile(self):
+        """
+        Makes the table entries inserted inside the block the complete contents
+        of the tables they go to, based on the local copy of what was written
+        to the switch. Entries that are installed already cost no write, ones
+        with another action are modified, and when the block exits the other
+        entries of those tables are deleted. Multicast groups that exist with
+        the same ports are skipped too, ones with other ports or in an unknown
+        state are modified. Everything goes out as one write batch,
+        so running the same control plane again is cheap and changes nothing
+        """
+        if self.desired_keys is not None:
+            yield
+            return
+        self.desired_keys = set()
+        try:
+            with self.writeBatch():
+                yield
+                tables = {key[0] for key in self.desired_keys}
+                for key, table_entry in list(self.table_state.items()):
+                    if key[0] in tables and key not in self.desired_keys and not table_entry.is_default_action:
+                        self._remove(table_entry)
+        finally:
+            self.desired_keys = None
+
+    def syncTableState(self):
+        """
+        Rebuilds the local copy of the table entries and multicast groups by
+        reading them all back from the switch. If the groups cannot be read,
+        their state is unknown until reconcile() modifies them
+        """
+        self.table_state = {}
+        self.group_state = None
+        try:
+            for response in self.sw_conn.ReadTableEntries():
+                for entity in response.entities:
+                    self.table_state[tableEntryKey(entity.table_entry)] = entity.table_entry
+            group_state = {}
+            for response in self.sw_conn.ReadMulticastGroups():
+                for entity in response.entities:
+                    group = entity.packet_replication_engine_entry.multicast_group_entry
+                    group_state[group.multicast_group_id] = multicastGroupReplicas(group)
+            self.group_state = group_state
+        except grpc.RpcError as e:
+            printGrpcError(e)
+
+    def _track(self, updates):
+        for update in updates:
+            if update.entity.HasField('table_entry'):
+                table_entry = update.entity.table_entry
+                key = tableEntryKey(table_entry)
+                if update.type == p4runtime_pb2.Update.DELETE:
+                    self.table_state.pop(key, None)
+                else:
+                    self.table_state[key] = table_entry
+            elif self.group_state is not None:
+                group = update.entity.packet_replication_engine_entry.multicast_group_entry
+                if update.type == p4runtime_pb2.Update.DELETE:
+                    self.group_state.pop(group.multicast_group_id, None)
+                else:
+                    self.group_state[group.multicast_group_id] = multicastGroupReplicas(group)
+
+    def _write(self, update_type, table_entry=None, group=None):
+        update = p4runtime_pb2.Update(type=update_type)
+        if table_entry is not None:
+            update.entity.table_entry.CopyFrom(table_entry)
+        else:
+            update.entity.packet_replication_engine_entry.multicast_group_entry.CopyFrom(group)
+        if self.write_batch is not None:
+            self.write_batch.append(update)
+            self._track([update])
+            return
+        try:
+            self.sw_conn.WriteUpdates([update])
+            self._track([update])
+        except grpc.RpcError as e:
+            printGrpcError(e)
 
     def insertTableEntry(self, entry=None,
                         table_name=None, match_fields=None, action_name=None,
@@ -443,10 +623,26 @@ class P4RuntimeSwitch(P4Switch):
             action_name=action_name,
             action_params=action_params,
             priority=priority)
-        try:
-            self.sw_conn.WriteTableEntry(table_entry)
-        except grpc.RpcError as e:
-            printGrpcError(e)
+        self._insert(table_entry)
+
+    def _insert(self, table_entry):
+        # The default entry always exists, so it is modified
+        if table_entry.is_default_action:
+            update_type = p4runtime_pb2.Update.MODIFY
+        else:
+            update_type = p4runtime_pb2.Update.INSERT
+        if self.desired_keys is not None:
+            key = tableEntryKey(table_entry)
+            self.desired_keys.add(key)
+            installed = self.table_state.get(key)
+            if installed is not None:
+                if tableEntryAction(installed) == tableEntryAction(table_entry):
+                    return
+                update_type = p4runtime_pb2.Update.MODIFY
+        self._write(update_type, table_entry=table_entry)
+
+    def _remove(self, table_entry):
+        self._write(p4runtime_pb2.Update.DELETE, table_entry=table_entry)
 
     def removeTableEntry(self, entry=None,
                         table_name=None, match_fields=None, action_name=None,
@@ -466,41 +662,64 @@ class P4RuntimeSwitch(P4Switch):
             action_name=action_name,
             action_params=action_params,
             priority=priority)
-        try:
-            self.sw_conn.DeleteTableEntry(table_entry)
-        except grpc.RpcError as e:
-            printGrpcError(e)
+        self._remove(table_entry)
+
+    def prepareTableEntry(self, table_name, match_fields=(), action_name=None,
+                          action_params=(), default_action=False, priority=None):
+        """
+        Resolves the ids and bit widths of a table entry once, for inserting
+        many entries that only differ in their values with insertPreparedEntry:
+
+            fwd = sw.prepareTableEntry('TheIngress.ethernet_table', ['hdr.eth.dstAddr'],
+                                       'TheIngress.l2_forward', ['port'])
+            sw.insertPreparedEntry(fwd, [mac], [port])
+
+        Values are ints, bytes of the exact width, or anything insertTableEntry takes
+        """
+        return self.p4info_helper.prepareTableEntry(table_name, match_fields, action_name,
+                                                    action_params, default_action, priority)
+
+    def insertPreparedEntry(self, template, match_values=(), param_values=()):
+        self._insert(template.build(match_values, param_values))
+
+    def removePreparedEntry(self, template, match_values=(), param_values=()):
+        self._remove(template.build(match_values, param_values))
 
 
     def addMulticastGroup(self, mgid=None, ports=None):
         group = self.p4info_helper.buildMulticastGroup(mgid=mgid, ports=ports)
-        try:
-            self.sw_conn.CreateMulticastGroup(group)
-        except grpc.RpcError as e:
-            printGrpcError(e)
+        update_type = p4runtime_pb2.Update.INSERT
+        if self.desired_keys is not None:
+            # Unknown if the groups could not be read back, assume it exists
+            if self.group_state is None:
+                update_type = p4runtime_pb2.Update.MODIFY
+            elif mgid in self.group_state:
+                if self.group_state[mgid] == multicastGroupReplicas(group):
+                    return
+                update_type = p4runtime_pb2.Update.MODIFY
+        self._write(update_type, group=group)
 
     def deleteMulticastGroup(self, mgid=None, ports=None):
         group = self.p4info_helper.buildMulticastGroup(mgid=mgid, ports=ports)
-        try:
-            self.sw_conn.DeleteMulticastGroup(group)
-        except grpc.RpcError as e:
-            printGrpcError(e)
+        self._write(p4runtime_pb2.Update.DELETE, group=group)
 
     def updateMulticastGroup(self, mgid=None, ports=None):
         group = self.p4info_helper.buildMulticastGroup(mgid=mgid, ports=ports)
-        try:
-            self.sw_conn.UpdateMulticastGroup(group)
-        except grpc.RpcError as e:
-            printGrpcError(e)
+        self._write(p4runtime_pb2.Update.MODIFY, group=group)
 
-    def printTableEntries(self):
+    def printTableEntries(self, cached=False):
         """
         Prints the table entries from all tables on the switch.
-        :param p4info_helper: the P4Info helper
-        :param sw: the switch connection
+        :param cached: print the local copy of the entries instead of reading
+                       them from the switch, see reconcile()
         """
         print('\n----- Reading tables rules for %s -----' % self.sw_conn.name)
-        for response in self.sw_conn.ReadTableEntries():
+        if cached:
+            responses = [p4runtime_pb2.ReadResponse(entities=[p4runtime_pb2.Entity(table_entry=e)
+                                                              for e in self.table_state.values()])]
+        else:
+            responses = self.sw_conn.ReadTableEntries()
+        for response in responses:
             for entity in response.entities:
                 entry = entity.table_entry
                 table_name = self.p4info_helper.get_tables_name(entry.table_id)
@@ -19,20 +19,70 @@
  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
  """
 
-from lib.gen import GenInts, GenMultipleOfInRange
-from lib.test import CreateTestData, RunIntTest
+from lib.gen import GenInts, GenFloats, GenMultipleOfInRange
+from lib.test import CreateTestData, RunIntTest, RunFloatTest
+from lib.quant import AllReduceFloat
+from lib.trace import GetTracer, SEND, RECV
+from lib.daemon import Serve
 from lib.worker import *
-from scapy.all import Packet
+from lib.comm import send, receive
 import socket
+import struct
+import sys
 
 NUM_ITER   = 1     # TODO: Make sure your program can handle larger values
-CHUNK_SIZE = None  # TODO: Define me
+FLOAT_ITER = 1     # Float iterations, quantized per chunk (see lib/quant.py)
+CHUNK_SIZE = 32    # Elements per packet, must match CHUNK_SIZE in p4/main.p4
+NUM_SLOTS  = 16    # Chunks in flight, must not exceed POOL_SIZE in network.py
 
-class SwitchML(Packet):
-    name = "SwitchMLPacket"
-    fields_desc = [
-        # TODO: Implement me
-    ]
+SML_PORT  = 9999
+SWITCH_IP = "10.0.0.254"
+
+class SwitchML:
+    """
+    SwitchML header followed by CHUNK_SIZE values, see p4/main.p4
+
+    Packed and parsed with struct, so the hot path does not need scapy.
+    Show() prints the scapy dissection for debugging
+    """
+    __slots__ = ("rank", "slot", "chunk", "vals")
+    HEADER = struct.Struct("!BHI")
+    VALS   = struct.Struct("!%dI" % CHUNK_SIZE)
+
+    def __init__(self, rank=0, slot=0, chunk=0, vals=()):
+        self.rank, self.slot, self.chunk = rank, slot, chunk
+        self.vals = vals
+
+    def __bytes__(self):
+        return self.HEADER.pack(self.rank, self.slot, self.chunk) + self.VALS.pack(*self.vals)
+
+    @classmethod
+    def parse(cls, buf, offset=0):
+        pkt = cls(*cls.HEADER.unpack_from(buf, offset))
+        pkt.vals = list(cls.VALS.unpack_from(buf, offset + cls.HEADER.size))
+        return pkt
+
+    def Show(self):
+        ScapySwitchML()(bytes(self)).show()
+
+def ScapySwitchML():
+    """
+    The header as a scapy layer. scapy is slow to import, so this happens
+    on first use only
+    """
+    if ScapySwitchML.cls is None:
+        from scapy.all import Packet, ByteField, ShortField, IntField, FieldListField
+        class SwitchMLPacket(Packet):
+            name = "SwitchMLPacket"
+            fields_desc = [
+                ByteField("rank", 0),
+                ShortField("slot", 0),
+                IntField("chunk", 0),
+                FieldListField("vals", [], IntField("", 0), count_from=lambda pkt: CHUNK_SIZE),
+            ]
+        ScapySwitchML.cls = SwitchMLPacket
+    return ScapySwitchML.cls
+ScapySwitchML.cls = None
 
 def AllReduce(soc, rank, data, result):
     """
@@ -44,30 +94,68 @@ def AllReduce(soc, rank, data, result):
     :param [int]  res: the output vector
 
     This function is blocking, i.e. only returns with a result or error
+
+    Chunk i is aggregated in slot i % NUM_SLOTS. The next chunk of a slot is
+    only sent once the result of the previous one arrived, at which point the
+    switch has already emptied the slot.
     """
 
-    # TODO: Implement me
     # NOTE: Do not send/recv directly to/from the socket.
     #       Instead, please use the functions send() and receive() from lib/comm.py
     #       We will use modified versions of these functions to test your program
-    pass
+    num_chunks = len(data) // CHUNK_SIZE
+    tracer = GetTracer()
 
-def main():
-    rank = GetRankOrExit()
+    def send_chunk(chunk):
+        pkt = SwitchML(rank=rank, slot=chunk % NUM_SLOTS, chunk=chunk,
+                       vals=data[chunk * CHUNK_SIZE:(chunk + 1) * CHUNK_SIZE])
+        send(soc, bytes(pkt), (SWITCH_IP, SML_PORT))
+        if tracer:
+            tracer.Record(SEND, chunk, chunk % NUM_SLOTS)
 
-    s = None # TODO: Create a UDP socket. 
-    # NOTE: This socket will be used for all AllReduce calls.
-    #       Feel free to go with a different design (e.g. multiple sockets)
-    #       if you want to, but make sure the loop below still works
+    for chunk in range(min(NUM_SLOTS, num_chunks)):
+        send_chunk(chunk)
 
-    Log("Started...")
+    for _ in range(num_chunks):
+        pkt = SwitchML.parse(receive(soc, 2048)[0])
+        chunk = pkt.chunk
+        if tracer:
+            tracer.Record(RECV, chunk, chunk % NUM_SLOTS)
+        result[chunk * CHUNK_SIZE:(chunk + 1) * CHUNK_SIZE] = pkt.vals
+        if chunk + NUM_SLOTS < num_chunks:
+            send_chunk(chunk + NUM_SLOTS)
+
+def RunTests(soc, rank):
     for i in range(NUM_ITER):
         num_elem = GenMultipleOfInRange(2, 2048, 2 * CHUNK_SIZE) # You may want to 'fix' num_elem for debugging
         data_out = GenInts(num_elem)
         data_in = GenInts(num_elem, 0)
         CreateTestData("udp-iter-%d" % i, rank, data_out)
-        AllReduce(s, rank, data_out, data_in)
+        AllReduce(soc, rank, data_out, data_in)
         RunIntTest("udp-iter-%d" % i, rank, data_in, True)
+    for i in range(FLOAT_ITER):
+        num_elem = GenMultipleOfInRange(2, 2048, 2 * CHUNK_SIZE, seed=4242 + i)
+        data_out = GenFloats(num_elem)
+        data_in = GenFloats(num_elem, 0)
+        CreateTestData("udp-float-iter-%d" % i, rank, data_out)
+        AllReduceFloat(lambda d, r: AllReduce(soc, rank, d, r), data_out, data_in, CHUNK_SIZE)
+        RunFloatTest("udp-float-iter-%d" % i, rank, data_in, std_out=True)
+
+def main():
+    rank = GetRankOrExit()
+
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("", SML_PORT))
+    # NOTE: This socket will be used for all AllReduce calls.
+    #       Feel free to go with a different design (e.g. multiple sockets)
+    #       if you want to, but make sure the loops in RunTests() still work
+
+    Log("Started...")
+    # python worker.py <rank> [daemon]
+    if sys.argv[2:3] == ["daemon"]:
+        Serve(rank, lambda args: RunTests(s, rank))
+    else:
+        RunTests(s, rank)
     Log("Done")
 
 if __name__ == '__main__':